@@ -0,0 +1,158 @@
+"""
+Edge maps computed in the background for the display loops.
+
+run() blocks the event handling and the display for as long as it computes.
+Background runs an operator instance (Sobel4, Prewitt, Canny ...) on a worker
+thread: the loop submits a frame and goes on, displaying the last finished edge
+map (front buffer) while the next one is computed (back buffer). A frame waiting
+for the worker is replaced by a newer one, its future is cancelled, so the
+display never falls behind the frames.
+
+    driver = Background(Sobel4(surface, pygame.surfarray.array3d(surface), vectorized=True))
+    while running:
+        driver.submit(surface, pygame.surfarray.array3d(surface))
+        if driver.front is not None:
+            screen.blit(pygame.surfarray.make_surface(driver.front), (0, 0))
+
+submit() returns a concurrent.futures.Future, await compute() from asyncio.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+
+class Background:
+    """
+    Double-buffered background driver of an operator instance, the worker thread
+    sets operator.surface, operator.array and operator.shape to the submitted
+    frame and calls operator.run(). The worker reads a copy of the surface taken
+    by submit(), run() may lock it and the display goes on blitting the original.
+    """
+
+    def __init__(self, operator):
+        self.operator = operator
+        # Last finished result, what the display shows (None before the first one)
+        self.front = None
+        # Result being computed
+        self.back = None
+        # Sequence number of the frame in front, compute time of the front
+        self.frame = 0
+        self.seconds = 0.0
+        # Frames replaced by a newer one before being computed
+        self.dropped = 0
+        self._condition = threading.Condition()
+        self._pending = None
+        # A frame is taken by the worker and not swapped in front yet
+        self._running = False
+        self._sequence = 0
+        self._thread = None
+        self._closed = False
+
+    def submit(self, surface_=None, array_=None):
+        """
+        Compute the edge map of a frame (the current operator inputs when None), a
+        frame still waiting is dropped. Returns a Future of the result.
+        """
+        if surface_ is None:
+            surface_ = getattr(self.operator, 'surface', None)
+        if surface_ is not None:
+            # The worker never touches the surface of the caller (display, blit)
+            surface_ = surface_.copy()
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('Background driver closed')
+            self._sequence += 1
+            if self._pending is not None:
+                self._pending[0].cancel()
+                self.dropped += 1
+            self._pending = (future, self._sequence, surface_, array_)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name='Background', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    async def compute(self, surface_=None, array_=None):
+        """
+        submit() for asyncio, the result of the frame (CancelledError if dropped).
+        """
+        return await asyncio.wrap_future(self.submit(surface_, array_))
+
+    def busy(self):
+        """
+        True while a frame is computed or waiting.
+        """
+        with self._condition:
+            return self._pending is not None or self._running
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                future, sequence, surface_, array_ = self._pending
+                self._pending = None
+                self._running = True
+            if not future.set_running_or_notify_cancel():
+                with self._condition:
+                    self._running = False
+                continue
+            try:
+                # CannyPipeline reads the array only, it has no surface nor shape
+                if hasattr(self.operator, 'surface'):
+                    self.operator.surface = surface_
+                if array_ is not None:
+                    self.operator.array = array_
+                    if hasattr(self.operator, 'shape'):
+                        self.operator.shape = array_.shape
+                start = time.perf_counter()
+                self.back = self.operator.run()
+                seconds = time.perf_counter() - start
+            except BaseException as error:
+                with self._condition:
+                    self.back = None
+                    self._running = False
+                future.set_exception(error)
+                continue
+            with self._condition:
+                # Swap the buffers, the display picks the new front on its next frame
+                result = self.front = self.back
+                self.back = None
+                self.frame = sequence
+                self.seconds = seconds
+                self._running = False
+            future.set_result(result)
+
+    def close(self, wait=True):
+        """
+        Stop the worker thread, the frame waiting is cancelled.
+        """
+        with self._condition:
+            self._closed = True
+            if self._pending is not None:
+                self._pending[0].cancel()
+                self._pending = None
+            self._condition.notify()
+            thread = self._thread
+        if wait and thread is not None:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,228 @@
+"""
+Headless batch processing of image files.
+
+The files are split into chunks spread over a process pool. Inside a worker the
+chunk runs as a pipeline: the next file is decoded and the previous result is
+encoded by 2 threads while the current one is computed, so decoding, compute and
+encoding overlap. The results are written as PNG files into the output directory,
+keeping the relative paths of the files found in the input directories.
+
+    python Batch.py photos/ scan.png -o edges/ --operator canny --threshold 90 --low-threshold 30
+    python Batch.py photos/ -o blurred/ --operator blur --workers 4
+"""
+
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy
+
+import Engine
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tga', '.gif', '.tif', '.tiff', '.webp')
+
+# Files per task, a worker pipelines the files of its chunk
+CHUNK = 8
+
+
+def find_images(inputs, output_directory):
+    """
+    (source, target) pairs of the input files and of the image files found in the
+    input directories (recursively), the targets are .png files of output_directory.
+    Raises ValueError when 2 sources would write the same target (a.jpg and a.png,
+    or the same name in 2 inputs).
+    """
+    jobs = []
+    for input_ in inputs:
+        if os.path.isdir(input_):
+            for root, directories, files in os.walk(input_):
+                directories.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(EXTENSIONS):
+                        source = os.path.join(root, name)
+                        relative = os.path.relpath(source, input_)
+                        jobs.append((source, os.path.join(output_directory,
+                                                          os.path.splitext(relative)[0] + '.png')))
+        else:
+            name = os.path.splitext(os.path.basename(input_))[0] + '.png'
+            jobs.append((input_, os.path.join(output_directory, name)))
+    sources = {}
+    for source, target in jobs:
+        key = os.path.normcase(os.path.normpath(target))
+        if key in sources:
+            raise ValueError('%s and %s would both be written to %s' % (sources[key], source, target))
+        sources[key] = source
+    return jobs
+
+
+def decode(path, settings):
+    """
+    Pixels the operator reads: the red channel (what the classes read), its
+    luminance, or the (W, H, 3) array for 'blur'.
+    """
+    import pygame
+    surface = pygame.image.load(path)
+    if settings['operator'] == 'blur':
+        return pygame.surfarray.array3d(surface)
+    if settings['luminance']:
+        return Engine.luminance(pygame.surfarray.array3d(surface))
+    return pygame.surfarray.array_red(surface)
+
+
+def compute(array_, settings):
+    """
+    uint8 result of the operator for the decoded pixels.
+    """
+    if settings['operator'] == 'blur':
+        return Engine.convert(Engine.gaussian_blur(array_, exact=False), numpy.uint8)
+    return Engine.run(array_, settings['operator'], settings['threshold'], compact=numpy.uint8,
+                      low_threshold=settings['low_threshold'], norm=settings['norm'])
+
+
+def encode(result, path):
+    import pygame
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    pygame.image.save(Engine.to_surface(result), path)
+
+
+def _timed(function, *arguments):
+    start = time.perf_counter()
+    return function(*arguments), time.perf_counter() - start
+
+
+def process_chunk(jobs, settings):
+    """
+    Process a list of (source, target), decoding the next file and encoding the
+    previous one while the current one is computed.
+    Returns a record per file: (source, pixels, decode, compute, encode seconds, error).
+    """
+    records = []
+    with ThreadPoolExecutor(max_workers=2) as io:
+        decoding = io.submit(_timed, decode, jobs[0][0], settings)
+        encoding = []
+        for index, (source, target) in enumerate(jobs):
+            try:
+                array_, decode_time = decoding.result()
+            except Exception as error:
+                array_, decode_time = error, 0.0
+            if index + 1 < len(jobs):
+                decoding = io.submit(_timed, decode, jobs[index + 1][0], settings)
+            if isinstance(array_, Exception):
+                records.append([source, 0, decode_time, 0.0, 0.0, repr(array_)])
+                encoding.append(None)
+                continue
+            try:
+                result, compute_time = _timed(compute, array_, settings)
+            except Exception as error:
+                records.append([source, 0, decode_time, 0.0, 0.0, repr(error)])
+                encoding.append(None)
+                continue
+            records.append([source, int(result.shape[0] * result.shape[1]), decode_time,
+                            compute_time, 0.0, None])
+            encoding.append(io.submit(_timed, encode, result, target))
+        for record, future in zip(records, encoding):
+            if future is None:
+                continue
+            try:
+                record[4] = future.result()[1]
+            except Exception as error:
+                record[5] = repr(error)
+    return [tuple(record) for record in records]
+
+
+def run(jobs, settings, workers=None, chunk=CHUNK):
+    """
+    Process all the jobs, over a process pool when workers > 1 (defaults to the
+    number of cores). Returns the records of process_chunk in the order of the jobs.
+    """
+    chunks = [jobs[index:index + chunk] for index in range(0, len(jobs), chunk)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(chunks))
+    if workers <= 1:
+        return [record for part in chunks for record in process_chunk(part, settings)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = executor.map(process_chunk, chunks, [settings] * len(chunks))
+        return [record for part in parts for record in part]
+
+
+def statistics(records, seconds):
+    """
+    Throughput of a batch, records of run() and wall time in seconds.
+    """
+    done = [record for record in records if record[5] is None]
+    pixels = sum(record[1] for record in done)
+    return {
+        'files': len(done),
+        'failed': len(records) - len(done),
+        'seconds': seconds,
+        'files_per_second': len(done) / seconds if seconds else 0.0,
+        'megapixels_per_second': pixels / seconds / 1e6 if seconds else 0.0,
+        'decode_seconds': sum(record[2] for record in records),
+        'compute_seconds': sum(record[3] for record in records),
+        'encode_seconds': sum(record[4] for record in records),
+    }
+
+
+def main(argv=None):
+    operators = sorted(Engine.OPERATORS) + ['blur']
+    parser = argparse.ArgumentParser(description='Edge detection of image files and directories')
+    parser.add_argument('inputs', nargs='+', help='image files or directories')
+    parser.add_argument('-o', '--output', required=True, help='output directory')
+    parser.add_argument('--operator', default='sobel', choices=operators)
+    parser.add_argument('--threshold', type=float, help='defaults to the threshold of the operator')
+    parser.add_argument('--low-threshold', type=float,
+                        help='double threshold with hysteresis, --threshold is the high one')
+    parser.add_argument('--norm', default='exact', choices=Engine.NORMS, help='magnitude of the gradient')
+    parser.add_argument('--luminance', action='store_true',
+                        help='read the luminance instead of the red channel')
+    parser.add_argument('--workers', type=int, help='worker processes, defaults to the number of cores')
+    parser.add_argument('--chunk', type=int, default=CHUNK, help='files per task')
+    arguments = parser.parse_args(argv)
+
+    try:
+        jobs = find_images(arguments.inputs, arguments.output)
+    except ValueError as error:
+        parser.error(str(error))
+    if not jobs:
+        parser.error('no image found')
+    settings = {
+        'operator': arguments.operator,
+        'threshold': arguments.threshold,
+        'low_threshold': arguments.low_threshold,
+        'norm': arguments.norm,
+        'luminance': arguments.luminance,
+    }
+    start = time.perf_counter()
+    records = run(jobs, settings, arguments.workers, arguments.chunk)
+    report = statistics(records, time.perf_counter() - start)
+
+    for source, _, _, _, _, error in records:
+        if error is not None:
+            print('FAILED %s: %s' % (source, error), file=sys.stderr)
+    print('%d files (%d failed) in %.2f s, %.1f files/s, %.2f Mpixels/s' % (
+        report['files'], report['failed'], report['seconds'], report['files_per_second'],
+        report['megapixels_per_second']))
+    print('decode %.2f s, compute %.2f s, encode %.2f s (summed over the workers)' % (
+        report['decode_seconds'], report['compute_seconds'], report['encode_seconds']))
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Headless benchmark of the operator classes.
+
+Every class (Sobel, Sobel2, Sobel3, Sobel4, Prewitt, GaussianBlur5x5 and Canny) is
+timed on a grid of image sizes, with the vectorized engine and, on the small sizes
+only, with the per-pixel loops. The best time of the repeats gives the pixels per
+second, the peak memory allocated during one run is measured with tracemalloc.
+No window is opened (SDL dummy video driver).
+
+    python Benchmark.py --output baseline.json
+    python Benchmark.py --baseline baseline.json --tolerance 0.25
+
+With --baseline the results are compared with the stored ones, the slower or
+heavier runs are reported and the exit status is 1.
+
+--imports also times the start of a fresh interpreter importing each module of
+IMPORTS (what a spawned worker pays) and tells whether pygame was loaded.
+"""
+
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy
+import pygame
+
+from Canny import Canny, GaussianBlur5x5
+from Prewitt import Prewitt
+from Sobel import Sobel, Sobel2, Sobel3, Sobel4
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+CLASSES = (Sobel, Sobel2, Sobel3, Sobel4, Prewitt, GaussianBlur5x5, Canny)
+
+# Image sizes of the vectorized runs
+SIZES = ((320, 240), (800, 600), (1920, 1080))
+
+# The per-pixel loops process ~100k pixels per second, small sizes only
+LOOP_SIZES = ((64, 48),)
+
+# Modules of the import times, the engine modules must not load pygame
+IMPORTS = ('numpy', 'pygame', 'Engine', 'Sobel', 'Prewitt', 'Canny', 'Parallel')
+
+_IMPORT = ("import sys, time; start = time.perf_counter(); import %s; "
+           "print(time.perf_counter() - start, 'pygame' in sys.modules)")
+
+IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Assets', 'Graphics', 'seychelles_gray.jpg')
+
+
+def test_surface(width, height):
+    """
+    The demo picture scaled to width x height, random noise when it is missing.
+    """
+    if os.path.exists(IMAGE):
+        return pygame.transform.smoothscale(pygame.image.load(IMAGE), (width, height))
+    noise = numpy.random.default_rng(0).integers(0, 256, (width, height, 3), dtype=numpy.uint8)
+    return pygame.surfarray.make_surface(noise)
+
+
+def measure(class_, surface, vectorized, repeat=3):
+    """
+    Time class_(surface, array3d).run(), returns a result record.
+    """
+    array_ = pygame.surfarray.array3d(surface)
+    if vectorized:
+        # Warm-up, the first call builds the lookup tables
+        class_(surface, array_, vectorized=True).run()
+    timings = []
+    for _ in range(repeat):
+        operator = class_(surface, array_, vectorized=vectorized)
+        start = time.perf_counter()
+        operator.run()
+        timings.append(time.perf_counter() - start)
+    # A separate run for the memory, tracemalloc slows the allocations down
+    operator = class_(surface, array_, vectorized=vectorized)
+    tracemalloc.start()
+    try:
+        operator.run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    width, height = surface.get_size()
+    seconds = min(timings)
+    return {
+        'operator': class_.__name__,
+        'mode': 'vectorized' if vectorized else 'loops',
+        'width': width,
+        'height': height,
+        'seconds': seconds,
+        'pixels_per_second': width * height / seconds if seconds else float('inf'),
+        'peak_bytes': peak,
+    }
+
+
+def import_time(module, repeat=5):
+    """
+    Best times of a fresh interpreter importing module: the import alone and the
+    whole process (start, import and exit), and whether pygame was loaded.
+    """
+    environment = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    directory = os.path.dirname(os.path.abspath(__file__))
+    seconds, process_seconds = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', _IMPORT % module], cwd=directory, env=environment,
+                                stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+        process_seconds.append(time.perf_counter() - start)
+        import_seconds, pygame_loaded = output.split()[-2:]
+        seconds.append(float(import_seconds))
+    return {
+        'module': module,
+        'seconds': min(seconds),
+        'process_seconds': min(process_seconds),
+        'pygame': pygame_loaded == 'True',
+    }
+
+
+def run_suite(sizes=SIZES, loop_sizes=LOOP_SIZES, repeat=3, classes=CLASSES, log=None):
+    """
+    Benchmark every class on every size, returns the JSON document.
+    """
+    results = []
+    for mode_sizes, vectorized in ((sizes, True), (loop_sizes, False)):
+        for width, height in mode_sizes:
+            surface = test_surface(width, height)
+            for class_ in classes:
+                result = measure(class_, surface, vectorized, repeat if vectorized else 1)
+                results.append(result)
+                if log is not None:
+                    log(result)
+    return {
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'pygame': pygame.version.ver,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+
+
+def _key(result):
+    return result['operator'], result['mode'], result['width'], result['height']
+
+
+def compare(current, baseline, tolerance=0.2):
+    """
+    Regressions of current against baseline (2 documents of run_suite), a run is
+    flagged when its throughput drops or its peak memory grows by more than tolerance.
+    Returns a list of (key, metric, baseline value, current value).
+    """
+    reference = dict((_key(result), result) for result in baseline['results'])
+    regressions = []
+    for result in current['results']:
+        before = reference.get(_key(result))
+        if before is None:
+            continue
+        if result['pixels_per_second'] < before['pixels_per_second'] * (1 - tolerance):
+            regressions.append((_key(result), 'pixels_per_second',
+                                before['pixels_per_second'], result['pixels_per_second']))
+        if result['peak_bytes'] > before['peak_bytes'] * (1 + tolerance):
+            regressions.append((_key(result), 'peak_bytes', before['peak_bytes'], result['peak_bytes']))
+    return regressions
+
+
+def _size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def _print_result(result):
+    print('%-16s %-10s %5dx%-5d %9.4f s %14.0f pixels/s %10.1f MB' % (
+        result['operator'], result['mode'], result['width'], result['height'], result['seconds'],
+        result['pixels_per_second'], result['peak_bytes'] / 1048576.0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless benchmark of the edge detection operators')
+    parser.add_argument('--sizes', nargs='*', type=_size, default=list(SIZES),
+                        help='image sizes of the vectorized runs, WIDTHxHEIGHT')
+    parser.add_argument('--loop-sizes', nargs='*', type=_size, default=list(LOOP_SIZES),
+                        help='image sizes of the per-pixel loops, none to skip them')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measure, the best one is kept')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results stored in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative slowdown or memory growth flagged as a regression')
+    parser.add_argument('--imports', action='store_true',
+                        help='time a fresh interpreter importing the modules (worker start)')
+    arguments = parser.parse_args(argv)
+
+    document = run_suite(arguments.sizes, arguments.loop_sizes, arguments.repeat, log=_print_result)
+    if arguments.imports:
+        document['imports'] = [import_time(module) for module in IMPORTS]
+        for result in document['imports']:
+            print('import %-10s %8.4f s, process %8.4f s%s' % (result['module'], result['seconds'],
+                                                              result['process_seconds'],
+                                                              ', loads pygame' if result['pygame'] else ''))
+    if arguments.output:
+        with open(arguments.output, 'w') as file_:
+            json.dump(document, file_, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file_:
+            baseline = json.load(file_)
+        regressions = compare(document, baseline, arguments.tolerance)
+        for (operator, mode, width, height), metric, before, after in regressions:
+            print('REGRESSION %s %s %dx%d %s: %.4g -> %.4g' % (operator, mode, width, height,
+                                                             metric, before, after))
+        if regressions:
+            return 1
+        print('No regression against %s' % arguments.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
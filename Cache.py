@@ -0,0 +1,179 @@
+"""
+Content-addressed cache of the edge maps.
+
+The key is a hash of the input content, the operator (class name or Engine
+operator), its kernels and its parameters (threshold). A hit skips the
+convolution entirely. Results are kept in memory in a LRU bounded by a byte budget
+and optionally on disk as compressed .npz files, surviving between runs.
+
+    cache = Cache(max_bytes=512 * 1024 * 1024, directory='edge_cache')
+    array = cache.run(Sobel4(TEXTURE1, pygame.surfarray.array3d(TEXTURE1)))
+    array = cache.compute(pygame.surfarray.array3d(TEXTURE1)[..., 0], 'canny')
+    print(cache.statistics())
+
+The arrays returned are shared with the cache and read-only.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy
+
+import Engine
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+# Attributes holding the kernels of the operator classes
+KERNEL_ATTRIBUTES = ('gx', 'gy', 'sobel_h', 'sobel_v', 'gx_h', 'gx_v', 'gy_h', 'gy_v', 'kernel')
+
+# Attributes of the operator classes changing the output of run()
+SETTINGS = ('threshold', 'compact', 'suppression', 'low_threshold', 'norm', 'quantize')
+
+
+def _update(digest, array_):
+    array_ = numpy.ascontiguousarray(array_)
+    digest.update(repr((array_.shape, array_.dtype.str)).encode())
+    digest.update(memoryview(array_).cast('B'))
+
+
+def content_key(arrays, *parameters):
+    """
+    Hex digest of the content of the arrays and of the parameters.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for array_ in arrays:
+        _update(digest, array_)
+    digest.update(repr(parameters).encode())
+    return digest.hexdigest()
+
+
+class Cache:
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        """
+        Cached result for key or None, looking in memory then on disk.
+        """
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+        if self.directory is not None and os.path.exists(self._path(key)):
+            with numpy.load(self._path(key)) as data:
+                result = data['edges']
+            self.disk_hits += 1
+            self._remember(key, result)
+            return result
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        if self.directory is not None and not os.path.exists(self._path(key)):
+            # Write to a temporary name first, a concurrent reader never sees a partial file
+            temporary = self._path(key) + '.%d.tmp' % os.getpid()
+            with open(temporary, 'wb') as file_:
+                numpy.savez_compressed(file_, edges=result)
+            os.replace(temporary, self._path(key))
+        return self._remember(key, result)
+
+    def _remember(self, key, result):
+        result = numpy.asarray(result)
+        result.setflags(write=False)
+        if result.nbytes > self.max_bytes:
+            return result
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key).nbytes
+        self.entries[key] = result
+        self.bytes += result.nbytes
+        # Least recently used first
+        while self.bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.evictions += 1
+        return result
+
+    def run(self, operator):
+        """
+        run() of an operator instance (Sobel4, Prewitt, Canny, GaussianBlur5x5 ...)
+        through the cache. The key covers the surface pixels, the array, the class,
+        its kernels and its SETTINGS. run() also sets the direction_array of the
+        operator, an operator with a direction is run without the cache.
+        """
+        if getattr(operator, 'direction', None) is not None:
+            return operator.run()
+        kernels = [getattr(operator, name) for name in KERNEL_ATTRIBUTES if hasattr(operator, name)]
+        settings = [(name, getattr(operator, name)) for name in SETTINGS if hasattr(operator, name)]
+        if getattr(operator, 'surface', None) is None:
+            # The classes read the array alone
+            key = content_key([operator.array] + kernels, type(operator).__name__, settings)
+        else:
+            surface = numpy.frombuffer(operator.surface.get_buffer().raw, dtype=numpy.uint8)
+            key = content_key([surface, operator.array] + kernels, type(operator).__name__,
+                              operator.surface.get_size(), settings)
+        result = self.get(key)
+        if result is None:
+            result = self.put(key, operator.run())
+        operator.source_array = result
+        return result
+
+    def compute(self, array_, operator='sobel', threshold=None):
+        """
+        Engine operator through the cache. array_ is a (W, H) channel for the gradient
+        operators or a (W, H, 3) array for 'blur'.
+        """
+        array_ = numpy.asarray(array_)
+        if operator != 'blur':
+            if array_.ndim == 3:
+                array_ = array_[..., 0]
+            if threshold is None:
+                threshold = Engine.OPERATORS[operator].threshold
+        key = content_key([array_], operator, Engine.kernels(operator), threshold)
+        result = self.get(key)
+        if result is None:
+            target = numpy.zeros(array_.shape[:2] + (3,))
+            Engine.compute_region(array_, target, operator, threshold,
+                                  Engine.full_region(*array_.shape[:2]))
+            result = self.put(key, target)
+        return result
+
+    def clear(self):
+        """
+        Empty the memory tier, the files on disk are kept.
+        """
+        self.entries.clear()
+        self.bytes = 0
+
+    def statistics(self):
+        requests = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'hit_rate': (self.hits + self.disk_hits) / float(requests) if requests else 0.0,
+        }
@@ -1,7 +1,7 @@
-import pygame
 import numpy
-import time
-import math
+
+import Engine
+from Vectorized import Vectorized
 
 __author__ = "Yoann Berenguer"
 __copyright__ = "Copyright 2007."
@@ -13,9 +13,12 @@ __email__ = "yoyoberenguer@hotmail.com"
 __status__ = "Demo"
 
 
-class GaussianBlur5x5:
+class GaussianBlur5x5(Vectorized):
+
+    operator = 'blur'
+    reads_array = True
 
-    def __init__(self, surface_, array_):
+    def __init__(self, surface_, array_, vectorized=False):
 
         # kernel 5x5
         self.kernel = numpy.array(([[2, 4, 5, 4, 2],
@@ -25,13 +28,20 @@ class GaussianBlur5x5:
                                     [2, 4, 5, 4, 2]]))
         self.kernel = self.kernel * 1 / 159
         self.kernel_half = 2
-        self.surface = surface_
-        self.array = array_
-        self.shape = array_.shape
-        self.source_array = numpy.zeros((self.shape[0], self.shape[1], 3))
+        self._settings(surface_, array_, vectorized, gradient=False, direction=False)
+
+    def source(self):
+        """
+        Pixels the engine blurs, the channel 0 only in compact mode (the one Canny reads).
+        """
+        return self.array if self.compact is None else Engine.read_channel(None, self.array)
 
     def run(self):
 
+        if self.engine():
+            return self.run_engine()
+
+        self.source_array = numpy.zeros((self.shape[0], self.shape[1], 3))
         for y in range(2, self.shape[1] - 2):
 
             for x in range(2, self.shape[0] - 2):
@@ -53,12 +63,12 @@ class GaussianBlur5x5:
         return self.source_array
 
 
-class Canny:
+class Canny(Vectorized):
     """
     Sobel algorithm version 4
     """
 
-    def __init__(self, surface_, array_):
+    def __init__(self, surface_, array_, vectorized=False):
 
         self.gy = numpy.array(([-1, 0, 1],
                                [-2, 0, 2],
@@ -67,46 +77,129 @@ class Canny:
                                [0, 0, 0],
                                [1, 2, 1]))
         self.kernel_half = 1
-        self.surface = surface_
-        self.shape = array_.shape
-        self.array = array_
-        self.source_array = numpy.zeros((self.shape[0], self.shape[1], 3))
+        self._settings(surface_, array_, vectorized, direction=False)
         self.threshold = 70
+        # Non-maximum suppression (thin edges), always vectorized
+        self.suppression = False
+        # Double threshold, threshold becomes the high one and the pixels above
+        # low_threshold connected to a strong edge are kept (hysteresis)
+        self.low_threshold = None
+
+    @property
+    def operator(self):
+        """
+        Name of the operator in Engine.OPERATORS, with the non-maximum suppression or not.
+        """
+        return 'canny_nms' if self.suppression else 'canny'
 
     def run(self):
 
-        for y in range(2, self.shape[1] - 2):
+        if self.engine():
+            return self.run_engine()
 
-            for x in range(2, self.shape[0] - 2):
-                r_gx, r_gy = 0, 0
-                for kernel_offset_y in range(-self.kernel_half, self.kernel_half + 1):
-
-                    for kernel_offset_x in range(-self.kernel_half, self.kernel_half + 1):
-
-                        xx = x + kernel_offset_x
-                        yy = y + kernel_offset_y
-                        color = self.surface.get_at((xx, yy))
-                        # print(kernel_offset_y, kernel_offset_x)
-                        if kernel_offset_x != 0:
-                            k = self.gx[kernel_offset_x + self.kernel_half,
-                                        kernel_offset_y + self.kernel_half]
-                            r_gx += color[0] * k
-
-                        if kernel_offset_y != 0:
-                            k = self.gy[kernel_offset_x + self.kernel_half,
-                                        kernel_offset_y + self.kernel_half]
-                            r_gy += color[0] * k
-
-                magnitude = math.sqrt(r_gx ** 2 + r_gy ** 2)
-                # update the pixel if the magnitude is above threshold else black pixel
-                self.source_array[x, y] = magnitude if magnitude > self.threshold else 0
-        # cap the values
-        numpy.putmask(self.source_array, self.source_array > 255, 255)
-        numpy.putmask(self.source_array, self.source_array < 0, 0)
+        self.source_array = Engine.per_pixel(self.surface, self.shape, self.gx, self.gy,
+                                             self.kernel_half, self.threshold)
+        return self.source_array
+
+
+class CannyPipeline:
+    """
+    GaussianBlur5x5, gradient, direction, non-maximum suppression and thresholds
+    fused band by band on in-memory arrays. A band of columns is blurred with the
+    halo the next stages read, its gradient, direction and edges are computed and
+    only the edges are written to the output: the blurred image and the gradients
+    of the whole image are never built, nor converted through a Surface.
+    With quantize the blurred values are rounded to uint8, what the Surface made of
+    GaussianBlur5x5.run() holds, run() then returns what
+    Canny(pygame.surfarray.make_surface(blurred), blurred).run() returns.
+    """
+
+    def __init__(self, array_):
+        # (W, H, 3) array or (W, H) channel, only the channel 0 is read
+        self.array = array_
+        self.threshold = 70
+        # Double threshold with hysteresis, threshold becomes the high one
+        self.low_threshold = None
+        self.suppression = True
+        # Round the blurred values to uint8 (Surface round trip), False keeps the float64 blur
+        self.quantize = True
+        # None, 'radians' or a number of bins, the direction is then in direction_array
+        self.direction = None
+        self.direction_array = None
+        # numpy.uint8 or numpy.float32 for a single channel output, None for (W, H, 3) float64
+        self.compact = None
+        # Magnitude of the gradient, 'exact', 'l1', 'max' or 'lut' (see Engine.NORMS)
+        self.norm = 'exact'
+        # Columns per band
+        self.band = 64
+        self.source_array = None
+
+    def _band(self, channel, x0, x1, threshold, dtype, operator, raw=False):
+        """
+        Edges (and direction) of the columns x0 .. x1, the raw magnitude before the
+        threshold and the clamping when raw is True. The blur covers 3 more
+        columns on each side: the gradient of 1 more column is needed by the
+        suppression, and the block border (2 columns) stays outside of them.
+        """
+        width = channel.shape[0]
+        bx0, bx1 = max(x0 - 3, 0), min(x1 + 3, width)
+        gx0, gx1 = max(x0 - 1, 0), min(x1 + 1, width)
+        blurred = Engine.gaussian_blur_channel(channel, (bx0, bx1, 0, channel.shape[1]), not self.quantize)
+        if self.quantize:
+            blurred = Engine.convert(blurred, numpy.uint8)
+        gx, gy = Engine.gradient(blurred, operator, (gx0 - bx0, gx1 - bx0, 0, channel.shape[1]))
+        if raw:
+            values = Engine.raw_magnitude(gx, gy, dtype, self.norm, self.suppression, threshold)
+        else:
+            values = Engine.edge_map(gx, gy, threshold, dtype, self.suppression, self.norm)
+        inside = slice(x0 - gx0, x1 - gx0)
+        if self.direction_array is not None:
+            bins = None if self.direction == 'radians' else self.direction
+            self.direction_array[x0:x1] = Engine.direction(gx[inside], gy[inside], bins)
+        return values[inside]
+
+    def _edges(self, channel, threshold, compact, raw=False):
+        width, height = channel.shape
+        operator = 'canny_nms' if self.suppression else 'canny'
+        if raw:
+            # (W, H) raw magnitude, float32 for the compact dtypes
+            target = numpy.zeros((width, height), dtype=numpy.float64 if compact is None else numpy.float32)
+        elif compact is None:
+            target = numpy.zeros((width, height, 3))
+        else:
+            target = numpy.zeros((width, height), dtype=compact)
+        for x0 in range(0, width, self.band):
+            x1 = min(x0 + self.band, width)
+            values = self._band(channel, x0, x1, threshold, numpy.float64 if compact is None else compact,
+                                operator, raw)
+            if compact is None and not raw:
+                target[x0:x1] = values[..., numpy.newaxis]
+            else:
+                target[x0:x1] = values
+        return target
+
+    def run(self):
+        channel = self.array if self.array.ndim == 2 else self.array[:, :, 0]
+        if self.direction is None:
+            self.direction_array = None
+        else:
+            dtype = numpy.float64 if self.direction == 'radians' else numpy.uint8
+            self.direction_array = numpy.zeros(channel.shape, dtype=dtype)
+        if self.low_threshold is None:
+            self.source_array = self._edges(channel, self.threshold, self.compact)
+            return self.source_array
+        dtype = numpy.float64 if self.compact is None else self.compact
+        map_ = Engine.double_threshold(self._edges(channel, self.low_threshold, self.compact, raw=True),
+                                       self.threshold, self.low_threshold, dtype)
+        self.source_array = Engine.expand(map_) if self.compact is None else map_
         return self.source_array
 
 
 if __name__ == '__main__':
+    import pygame
+
+    from Background import Background
+
     numpy.set_printoptions(threshold=numpy.nan)
 
     SIZE = (800, 600)
@@ -119,11 +212,20 @@ if __name__ == '__main__':
     PADDING = pygame.transform.smoothscale(TEXTURE1, (SIZE[0] + 8, (SIZE[1] >> 1) + 8))
     pygame.display.set_caption('Canny algorithm')
 
-    G = GaussianBlur5x5(TEXTURE1, pygame.surfarray.array3d(TEXTURE1))
-    array = G.run()
-    print('Gaussian blur complete')
+    # GaussianBlur5x5 then Canny with the per-pixel loops, through a Surface
+    # G = GaussianBlur5x5(TEXTURE1, pygame.surfarray.array3d(TEXTURE1))
+    # array = G.run()
+    # print('Gaussian blur complete')
+    # Can = Canny(pygame.surfarray.make_surface(array), array)
+
+    # Blur, gradient and thresholds fused band by band, same result
+    Can = CannyPipeline(pygame.surfarray.array3d(TEXTURE1))
+    Can.suppression = False
 
-    Can = Canny(pygame.surfarray.make_surface(array), array)
+    # The edge maps are computed by a worker thread, the window keeps responding
+    DRIVER = Background(Can)
+    SHOWN = 0
+    surface = None
 
     FRAME = 0
     clock = pygame.time.Clock()
@@ -158,8 +260,8 @@ if __name__ == '__main__':
                 PAUSE = True
                 print('Paused')
 
-        t = time.time()
-        array = Can.run()
+        if not DRIVER.busy():
+            DRIVER.submit()
         # import hashlib
         # Checking hashes between 2 different method
         # hash = hashlib.md5()
@@ -169,16 +271,20 @@ if __name__ == '__main__':
         # hash_.update(array1.copy('C'))
 
         # print(hash.hexdigest() == hash_.hexdigest())
-        print(time.time() - t)
-
-        surface = pygame.surfarray.make_surface(array)
+        if DRIVER.frame != SHOWN:
+            # A new edge map is in the front buffer
+            SHOWN = DRIVER.frame
+            print(DRIVER.seconds)
+            surface = pygame.surfarray.make_surface(DRIVER.front)
 
         SCREEN.fill((0, 0, 0, 0))
         SCREEN.blit(TEXTURE1, (0, 0))
-        SCREEN.blit(surface, (0, SIZE[1] // 2))
+        if surface is not None:
+            SCREEN.blit(surface, (0, SIZE[1] // 2))
 
         pygame.display.flip()
         TIME_PASSED_SECONDS = clock.tick(120)
         FRAME += 1
 
+    DRIVER.close()
     pygame.quit()
@@ -0,0 +1,927 @@
+"""
+Vectorized engine for the edge detection operators.
+
+The functions below compute Gx and Gy for the whole image at once instead of
+visiting every pixel in Python loops. Arrays follow the pygame surfarray layout,
+array[x, y], and any leading axes are carried through untouched.
+
+The Sobel kernels are separable, an averaging kernel times a differentiation kernel
+        |-1 0 +1|     |1|
+        |-2 0 +2|  =  |2| [-1 0 +1]
+        |-1 0 +1|     |1|
+so each gradient is obtained with two 1-D passes. The operators are data (OPERATORS),
+any pair of kernels is accepted and the separable ones are detected.
+
+Integer inputs (pygame.surfarray.array3d returns uint8) are accumulated in int16
+(uint8) or int32, which is exact, and the result is bit-identical to the per-pixel classes:
+the same 2 pixels border left to zero, the same threshold test and the same
+clamping to [0, 255]. The 5x5 blur follows the products and the sums of the loops,
+bit-identical to them; the uint8 outputs use its integer sum, exact and divided once
+by 159 (see gaussian_blur_channel).
+
+Every function accepts a region (x0, x1, y0, y1) of the output. Only the region
+plus the kernel halo (1 pixel for the 3x3 kernels, 2 pixels for the 5x5 blur) is
+read from the source, and the values are the ones the whole image would give.
+The tiled, banded and incremental modes are built on it.
+
+Only NumPy is imported: pygame is loaded by the Surface adapters (red_channel,
+to_surface) when they are called, array work needs no SDL.
+"""
+
+import math
+
+import numpy
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+# Averaging and differentiation kernels of the Sobel operator
+SMOOTH = (1, 2, 1)
+DERIVATIVE = (-1, 0, 1)
+# Averaging kernel of the Prewitt operator
+PREWITT_SMOOTH = (1, 1, 1)
+# Prewitt.run() skips the products where the kernel offset is zero (the tests
+# kernel_offset_x != 0 and kernel_offset_y != 0), only the 4 corners contribute
+CORNERS_SMOOTH = (1, 0, 1)
+
+# Gaussian kernel 5x5 of GaussianBlur5x5
+BLUR_KERNEL = numpy.array(([[2, 4, 5, 4, 2],
+                            [4, 9, 12, 9, 4],
+                            [5, 12, 15, 12, 5],
+                            [4, 9, 12, 9, 4],
+                            [2, 4, 5, 4, 2]])) * 1 / 159
+
+# The same kernel in integers, it is symmetric and of rank 3: the sum of the 3
+# separable terms [1 0 0 0 1] x ROW_0 + [0 1 0 1 0] x ROW_1 + [0 0 1 0 0] x ROW_2,
+# each row given by its symmetric taps (distance 2, distance 1, centre)
+BLUR_ROWS = ((2, 4, 5), (4, 9, 12), (5, 12, 15))
+BLUR_NORM = 159
+
+# The loops never visit the 2 pixels border of the image
+BORDER = 2
+
+
+def accumulator(dtype, gain=4):
+    """
+    Exact accumulation type of the data: int16 for uint8 data when gain * 255 fits
+    (the 3x3 gradients stay within 4 * 255), int32 for the other integer data,
+    float64 otherwise. gain is the largest sum of the absolute kernel weights.
+    """
+    if dtype == numpy.uint8 or dtype == bool:
+        return numpy.int16 if gain * 255 <= numpy.iinfo(numpy.int16).max else numpy.int32
+    if numpy.issubdtype(dtype, numpy.integer):
+        return numpy.int32
+    return numpy.float64
+
+
+def working_array(channel, gain=4):
+    """
+    Return the channel with a dtype suitable for the accumulation.
+    """
+    channel = numpy.asarray(channel)
+    return channel.astype(accumulator(channel.dtype, gain))
+
+
+def correlate1d(array_, taps, axis):
+    """
+    1-D correlation of array_ with taps along axis, only the valid part is returned
+    (the axis shrinks by len(taps) - 1).
+    """
+    length = array_.shape[axis] - len(taps) + 1
+    index = [slice(None)] * array_.ndim
+    result = None
+    for offset, tap in enumerate(taps):
+        if tap == 0:
+            continue
+        index[axis] = slice(offset, offset + length)
+        term = array_[tuple(index)]
+        if result is None:
+            result = term * tap
+        elif tap == 1:
+            result += term
+        elif tap == -1:
+            result -= term
+        else:
+            result += term * tap
+    return result
+
+
+def correlate2d(array_, kernel):
+    """
+    2-D correlation of array_ with kernel over the last 2 axes (x, y), valid part
+    only. Used for the kernels that are not separable, the zero weights are skipped.
+    """
+    width = array_.shape[-2] - kernel.shape[0] + 1
+    height = array_.shape[-1] - kernel.shape[1] + 1
+    result = None
+    for i, j in zip(*numpy.nonzero(kernel)):
+        term = array_[..., i:i + width, j:j + height]
+        tap = kernel[i, j].item()
+        if result is None:
+            result = term * tap
+        else:
+            result += term * tap
+    return result
+
+
+def separate(kernel):
+    """
+    Split a rank-1 kernel into its 1-D factors (taps along x, taps along y) with
+    kernel[i, j] == taps_x[i] * taps_y[j] exactly, None when it is not separable.
+    Integer kernels give integer taps, the smoothing factor (the one with a non
+    zero sum) is made positive.
+    """
+    kernel = numpy.asarray(kernel)
+    if not kernel.any():
+        return None
+    i, j = numpy.unravel_index(numpy.argmax(numpy.abs(kernel)), kernel.shape)
+    taps_y = kernel[i, :]
+    if numpy.issubdtype(kernel.dtype, numpy.integer):
+        taps_y = taps_y // numpy.gcd.reduce(taps_y)
+        taps_x = kernel[:, j] // taps_y[j]
+    else:
+        taps_x = kernel[:, j] / taps_y[j]
+    if not numpy.array_equal(numpy.outer(taps_x, taps_y), kernel):
+        return None
+    if taps_x.sum() + taps_y.sum() < 0:
+        taps_x, taps_y = -taps_x, -taps_y
+    return tuple(taps_x.tolist()), tuple(taps_y.tolist())
+
+
+def full_region(width, height):
+    return 0, width, 0, height
+
+
+def window(width, height, region, border=BORDER):
+    """
+    Part of the region (x0, x1, y0, y1) the loops compute, x in [2, W - 3] and
+    y in [2, H - 3] (border pixels are left out). Returns None when the region
+    lies in the border.
+    """
+    x0, x1, y0, y1 = region
+    x0, x1 = max(x0, border), min(x1, width - border)
+    y0, y1 = max(y0, border), min(y1, height - border)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, x1, y0, y1
+
+
+def _sobel3(block, y0, height):
+    """
+    Gx and Gy exactly as Sobel3 computes them. Sobel3 stores the horizontal pass
+    only for y in [2, H - 3], the vertical pass then reads zeros on the rows y = 1
+    and y = H - 2, which changes the first and last rows of the result.
+    """
+    gxh = correlate1d(block, DERIVATIVE, -2)
+    gyh = correlate1d(block, SMOOTH, -2)
+    rows = numpy.arange(y0, y0 + block.shape[-1])
+    outside = (rows < BORDER) | (rows > height - BORDER - 1)
+    gxh[..., outside] = 0
+    gyh[..., outside] = 0
+    return correlate1d(gxh, SMOOTH, -1), correlate1d(gyh, DERIVATIVE, -1)
+
+
+class Operator:
+    """
+    Gradient operator given by its Gx and Gy kernels in the array[x, y] layout,
+    Gx[x, y] = sum(gx[i, j] * channel[x + i - half, y + j - half]), gy defaults to
+    gx transposed. Rank-1 kernels are detected and run as two 1-D passes, the
+    others as a 2-D correlation.
+    threshold is the default threshold, suppression adds the non-maximum suppression
+    (Canny) and passes replaces the convolution (per-class quirks, see _sobel3).
+    """
+
+    def __init__(self, gx, gy=None, threshold=0, suppression=False, passes=None):
+        self.gx = numpy.array(gx)
+        self.gy = self.gx.T.copy() if gy is None else numpy.array(gy)
+        if self.gx.shape != self.gy.shape or self.gx.shape[0] != self.gx.shape[1] \
+                or self.gx.shape[0] % 2 == 0:
+            raise ValueError('Expecting 2 square kernels of the same odd size')
+        self.threshold = threshold
+        self.suppression = suppression
+        self.passes = passes
+        self.half = self.gx.shape[0] // 2
+        # Pixels read around a region, the suppression compares with the neighbours
+        self.halo = self.half + (1 if suppression else 0)
+        # Largest |Gx| or |Gy| for a unit input
+        self.gain = max(numpy.abs(self.gx).sum(), numpy.abs(self.gy).sum()).item()
+        self.separable = separate(self.gx), separate(self.gy)
+
+    def _correlate(self, block, kernel, factors):
+        if factors is None:
+            return correlate2d(block, kernel)
+        taps_x, taps_y = factors
+        # The smoothing factor (weights of the same sign) first
+        if min(taps_y) >= 0 or max(taps_y) <= 0:
+            return correlate1d(correlate1d(block, taps_y, -1), taps_x, -2)
+        return correlate1d(correlate1d(block, taps_x, -2), taps_y, -1)
+
+    def kernel(self, block, y0, height):
+        """
+        Valid Gx and Gy of a block (region plus half pixels on each side), y0 is the
+        global row of the first line and height the image height.
+        """
+        if self.passes is not None:
+            return self.passes(block, y0, height)
+        return (self._correlate(block, self.gx, self.separable[0]),
+                self._correlate(block, self.gy, self.separable[1]))
+
+
+# Gx kernels of the operators (Gy is the transpose)
+SOBEL_X = numpy.outer(DERIVATIVE, SMOOTH)
+PREWITT_X = numpy.outer(DERIVATIVE, PREWITT_SMOOTH)
+PREWITT_CORNERS_X = numpy.outer(DERIVATIVE, CORNERS_SMOOTH)
+SCHARR_X = numpy.outer(DERIVATIVE, (3, 10, 3))
+SOBEL5_X = numpy.outer((-1, -2, 0, 2, 1), (1, 4, 6, 4, 1))
+SOBEL7_X = numpy.outer((-1, -4, -5, 0, 5, 4, 1), (1, 6, 15, 20, 15, 6, 1))
+
+# The operators by name, an operator is added with its kernels:
+#     OPERATORS['name'] = Operator(gx_kernel, gy_kernel, threshold)
+OPERATORS = {
+    # Sobel, Sobel2 and Sobel4
+    'sobel': Operator(SOBEL_X),
+    'sobel3': Operator(SOBEL_X, passes=_sobel3),
+    'prewitt': Operator(PREWITT_X),
+    # The Prewitt class, corners only
+    'prewitt_corners': Operator(PREWITT_CORNERS_X),
+    'canny': Operator(SOBEL_X, threshold=70),
+    # Canny with the non-maximum suppression
+    'canny_nms': Operator(SOBEL_X, threshold=70, suppression=True),
+    'scharr': Operator(SCHARR_X),
+    'sobel5': Operator(SOBEL5_X),
+    'sobel7': Operator(SOBEL7_X),
+}
+
+
+def halo(operator):
+    """
+    Pixels read around a region by the operator ('blur' or a name of OPERATORS).
+    """
+    if operator == 'blur':
+        return 2
+    return OPERATORS[operator].halo
+
+
+def kernels(operator):
+    """
+    Kernels of the operator as nested tuples, part of the result cache key (Cache.py).
+    """
+    if operator == 'blur':
+        return tuple(map(tuple, BLUR_KERNEL.tolist()))
+    spec = OPERATORS[operator]
+    return tuple(map(tuple, spec.gx.tolist())), tuple(map(tuple, spec.gy.tolist()))
+
+
+def gradient(channel, operator='sobel', region=None):
+    """
+    Gx and Gy of the operator for a (..., W, H) channel, Gx is the derivative along x,
+    Gy along y. With a region (x0, x1, y0, y1) only the region plus the kernel
+    half size is read and the returned arrays are (..., x1 - x0, y1 - y0).
+    """
+    if not hasattr(channel, 'shape'):
+        channel = numpy.asarray(channel)
+    spec = OPERATORS[operator]
+    width, height = channel.shape[-2:]
+    if region is None:
+        region = full_region(width, height)
+    x0, x1, y0, y1 = region
+    dtype = accumulator(channel.dtype, spec.gain)
+    shape = channel.shape[:-2] + (x1 - x0, y1 - y0)
+    gx, gy = numpy.zeros(shape, dtype=dtype), numpy.zeros(shape, dtype=dtype)
+    half = spec.half
+    inside = window(width, height, region, max(BORDER, half))
+    if inside is not None:
+        wx0, wx1, wy0, wy1 = inside
+        block = working_array(channel[..., wx0 - half:wx1 + half, wy0 - half:wy1 + half], spec.gain)
+        bgx, bgy = spec.kernel(block, wy0 - half, height)
+        gx[..., wx0 - x0:wx1 - x0, wy0 - y0:wy1 - y0] = bgx
+        gy[..., wx0 - x0:wx1 - x0, wy0 - y0:wy1 - y0] = bgy
+    return gx, gy
+
+
+# Magnitude of the gradient: 'exact' sqrt(Gx ** 2 + Gy ** 2), 'l1' |Gx| + |Gy|,
+# 'max' max(|Gx|, |Gy|) and 'lut' the exact sqrt read from a table (sqrt_table)
+NORMS = ('exact', 'l1', 'max', 'lut')
+
+# Tables of sqrt_table(), one per threshold and dtype
+_SQRT_TABLES = {}
+
+
+def sqrt_table(threshold=0, dtype=numpy.float64):
+    """
+    Final value of edge_map() for each integer Gx ** 2 + Gy ** 2, threshold and
+    clamping included. The table stops at (K + 1) ** 2 - 1, K = max(255, threshold + 1),
+    any larger sum gives 255.
+    """
+    key = (threshold, numpy.dtype(dtype))
+    table = _SQRT_TABLES.get(key)
+    if table is None:
+        limit = max(255, int(threshold) + 1) + 1
+        working = numpy.float64 if dtype == numpy.float64 else numpy.float32
+        values = numpy.sqrt(numpy.arange(limit * limit, dtype=working))
+        values[~(values > threshold)] = 0
+        numpy.clip(values, 0, 255, out=values)
+        table = _SQRT_TABLES[key] = convert(values, dtype)
+    return table
+
+
+def edge_map(gx, gy, threshold=0, dtype=numpy.float64, suppression=False, norm='exact'):
+    """
+    G = sqrt(Gx ** 2 + Gy ** 2), set to zero when not above threshold and capped to 255.
+    Returns a single channel array, float64 by default, float32 or uint8 (rounded)
+    for the compact mode. The squares of the integer gradients are exact in float32,
+    the float32 map is the float64 one rounded.
+    norm is one of NORMS, 'l1' and 'max' are cheaper approximations, 'lut' gives
+    the 'exact' values for integer gradients with a single table lookup.
+    With suppression the non-maxima are removed before the threshold.
+    """
+    if norm not in NORMS:
+        raise ValueError('norm must be one of %s, got %r' % (NORMS, norm))
+    integer = numpy.issubdtype(gx.dtype, numpy.integer)
+    if norm == 'lut' and integer and not suppression:
+        table = sqrt_table(threshold, dtype)
+        # 2 * 32767 ** 2 fits in int32
+        working = numpy.int32 if gx.dtype.itemsize <= 2 else numpy.int64
+        squares = numpy.multiply(gx, gx, dtype=working)
+        squares += numpy.multiply(gy, gy, dtype=working)
+        numpy.minimum(squares, len(table) - 1, out=squares)
+        return table.take(squares)
+    magnitude_ = raw_magnitude(gx, gy, dtype, norm, suppression, threshold)
+    return threshold_map(magnitude_, threshold, dtype, copy=False)
+
+
+def raw_magnitude(gx, gy, dtype=numpy.float64, norm='exact', suppression=False, threshold=0):
+    """
+    Magnitude of the gradient before the threshold and the clamping: float64, or
+    float32 when dtype is a compact one, for 'exact' and 'lut'. 'l1' and 'max' of
+    integer gradients stay integers.
+    With suppression the non-maxima are set to zero, only the pixels above threshold
+    are examined and the pixels kept do not depend on it.
+    """
+    if norm == 'l1' or norm == 'max':
+        magnitude_ = numpy.abs(gx)
+        if norm == 'l1':
+            magnitude_ += numpy.abs(gy)
+        else:
+            numpy.maximum(magnitude_, numpy.abs(gy), out=magnitude_)
+    else:
+        working = numpy.float64 if dtype == numpy.float64 else numpy.float32
+        magnitude_ = numpy.multiply(gx, gx, dtype=working)
+        magnitude_ += numpy.multiply(gy, gy, dtype=working)
+        numpy.sqrt(magnitude_, out=magnitude_)
+    if suppression:
+        non_maximum_suppression(magnitude_, gx, gy, threshold)
+    return magnitude_
+
+
+def threshold_map(magnitude_, threshold=0, dtype=numpy.float64, copy=True):
+    """
+    Edge map of a raw magnitude, what edge_map() returns: zero when not above
+    threshold, capped to 255 and cast to dtype. The raw magnitude is kept unless
+    copy is False.
+    """
+    if copy:
+        magnitude_ = magnitude_.copy()
+    # update the pixel if the magnitude is above threshold else black pixel
+    magnitude_[~(magnitude_ > threshold)] = 0
+    # cap the values
+    numpy.clip(magnitude_, 0, 255, out=magnitude_)
+    return convert(magnitude_, dtype)
+
+
+# tan(22.5) and tan(67.5), limits of the 4 direction bins
+TAN_22_5 = 0.41421356237309503
+TAN_67_5 = 2.414213562373095
+
+# Neighbours along the gradient direction for each bin, offsets (dx, dy)
+NEIGHBOURS = (
+    ((1, 0), (-1, 0)),    # 0, horizontal gradient (vertical edge)
+    ((1, 1), (-1, -1)),   # 1, diagonal, Gx and Gy of the same sign
+    ((0, 1), (0, -1)),    # 2, vertical gradient (horizontal edge)
+    ((1, -1), (-1, 1)),   # 3, diagonal, Gx and Gy of opposite signs
+)
+
+
+def direction_bins(gx, gy):
+    """
+    Gradient direction quantized into the 4 standard bins (0, 45, 90 and 135 degrees)
+    as a uint8 array, see NEIGHBOURS.
+    """
+    ax, ay = numpy.abs(gx), numpy.abs(gy)
+    bins = numpy.where((gx > 0) == (gy > 0), numpy.uint8(1), numpy.uint8(3))
+    bins = numpy.where(ay <= ax * TAN_22_5, numpy.uint8(0), bins)
+    return numpy.where(ay > ax * TAN_67_5, numpy.uint8(2), bins)
+
+
+# Largest |Gx| or |Gy| of the uint8 images (4 * 255), extent of the direction tables
+DIRECTION_EXTENT = 1020
+
+# Lookup tables of direction(), one per number of bins
+_DIRECTION_TABLES = {}
+
+
+def _sectors(angle, bins):
+    # Sector k covers k * 2pi / bins +- pi / bins, counter-clockwise from +x
+    return (numpy.rint(angle * (bins / (2 * numpy.pi))).astype(numpy.int64) % bins).astype(numpy.uint8)
+
+
+def direction_table(bins):
+    """
+    (2 * DIRECTION_EXTENT + 1) ** 2 uint8 table of the sectors, indexed by
+    (Gx + DIRECTION_EXTENT) * (2 * DIRECTION_EXTENT + 1) + Gy + DIRECTION_EXTENT.
+    Built once per number of bins.
+    """
+    table = _DIRECTION_TABLES.get(bins)
+    if table is None:
+        values = numpy.arange(-DIRECTION_EXTENT, DIRECTION_EXTENT + 1, dtype=numpy.float64)
+        table = _sectors(numpy.arctan2(values[numpy.newaxis, :], values[:, numpy.newaxis]), bins).ravel()
+        _DIRECTION_TABLES[bins] = table
+    return table
+
+
+def direction(gx, gy, bins=None):
+    """
+    Gradient direction from the Gx, Gy of gradient(). bins None gives the float64
+    angle in radians, arctan2(Gy, Gx) in [-pi, pi]. An integer bins gives a uint8
+    sector 0 .. bins - 1, sector 0 centred on +x and counter-clockwise. Integer
+    gradients within DIRECTION_EXTENT are looked up in direction_table(), without
+    any trigonometry per pixel. A zero gradient (the border) gives 0.
+    """
+    if bins is None:
+        return numpy.arctan2(gy, gx)
+    if numpy.issubdtype(gx.dtype, numpy.integer) and gx.size and \
+            max(-int(gx.min()), int(gx.max()), -int(gy.min()), int(gy.max())) <= DIRECTION_EXTENT:
+        index = gx.astype(numpy.int32)
+        index += DIRECTION_EXTENT
+        index *= 2 * DIRECTION_EXTENT + 1
+        index += gy
+        index += DIRECTION_EXTENT
+        return direction_table(bins).take(index)
+    return _sectors(numpy.arctan2(gy, gx), bins)
+
+
+def non_maximum_suppression(magnitude_, gx, gy, threshold=0):
+    """
+    Thin the edges in place: a pixel above threshold is kept only when its magnitude
+    is not below its 2 neighbours along the gradient direction.
+    Only the pixels above the threshold are examined (the threshold removes the
+    others anyway), the cost follows the number of edge pixels, not the image size.
+    The outer ring of the array (image border or halo) is cleared.
+    """
+    height = magnitude_.shape[-1]
+    candidates = magnitude_ > threshold
+    candidates[..., [0, -1], :] = False
+    candidates[..., :, [0, -1]] = False
+    index = numpy.flatnonzero(candidates)
+    flat = magnitude_.reshape(-1)
+    values = flat[index]
+    bins = direction_bins(numpy.ravel(gx)[index], numpy.ravel(gy)[index])
+    # Offset of the first neighbour in the flat array, the second one is opposite
+    offsets = numpy.array([dx * height + dy for (dx, dy), _ in NEIGHBOURS])[bins]
+    keep = (values >= flat[index + offsets]) & (values >= flat[index - offsets])
+    flat[index[~keep]] = 0
+    magnitude_[..., [0, -1], :] = 0
+    magnitude_[..., :, [0, -1]] = 0
+    return magnitude_
+
+
+def suppressed_edge_map(channel, threshold=70, region=None, dtype=numpy.float64, norm='exact',
+                        operator='canny_nms'):
+    """
+    Edge map with the non-maximum suppression. The gradient is computed over the
+    region plus 1 pixel so the neighbours of the border pixels of the region are known.
+    """
+    width, height = channel.shape[-2:]
+    if region is None:
+        region = full_region(width, height)
+    x0, x1, y0, y1 = region
+    ex0, ex1 = max(x0 - 1, 0), min(x1 + 1, width)
+    ey0, ey1 = max(y0 - 1, 0), min(y1 + 1, height)
+    gx, gy = gradient(channel, operator, (ex0, ex1, ey0, ey1))
+    values = edge_map(gx, gy, threshold, dtype, True, norm)
+    return values[..., x0 - ex0:x1 - ex0, y0 - ey0:y1 - ey0]
+
+
+def operator_map(channel, operator='sobel', threshold=None, region=None, dtype=numpy.float64,
+                 norm='exact'):
+    """
+    Single channel edge map of any operator of OPERATORS for a region (the whole
+    channel by default), with its non-maximum suppression when it has one.
+    """
+    if threshold is None:
+        threshold = OPERATORS[operator].threshold
+    if OPERATORS[operator].suppression:
+        return suppressed_edge_map(channel, threshold, region, dtype, norm, operator)
+    gx, gy = gradient(channel, operator, region)
+    return edge_map(gx, gy, threshold, dtype, norm=norm)
+
+
+def magnitude_region(channel, operator='sobel', region=None, dtype=numpy.float64, norm='exact',
+                     threshold=0):
+    """
+    Raw magnitude (raw_magnitude) of any operator of OPERATORS for a region (the whole
+    channel by default), the values operator_map() thresholds and caps. With the
+    non-maximum suppression of the operator, only the pixels above threshold are kept.
+    """
+    if not OPERATORS[operator].suppression:
+        gx, gy = gradient(channel, operator, region)
+        return raw_magnitude(gx, gy, dtype, norm)
+    width, height = channel.shape[-2:]
+    if region is None:
+        region = full_region(width, height)
+    x0, x1, y0, y1 = region
+    ex0, ex1 = max(x0 - 1, 0), min(x1 + 1, width)
+    ey0, ey1 = max(y0 - 1, 0), min(y1 + 1, height)
+    gx, gy = gradient(channel, operator, (ex0, ex1, ey0, ey1))
+    values = raw_magnitude(gx, gy, dtype, norm, True, threshold)
+    return values[..., x0 - ex0:x1 - ex0, y0 - ey0:y1 - ey0]
+
+
+def convert(values, dtype):
+    """
+    Cast values in [0, 255] to the output dtype, float values are rounded for
+    integer types.
+    """
+    if numpy.issubdtype(dtype, numpy.integer) and not numpy.issubdtype(values.dtype, numpy.integer):
+        return numpy.rint(values, out=values).astype(dtype)
+    return values.astype(dtype, copy=False)
+
+
+def expand(map_):
+    """
+    Copy a single channel map into 3 channels, (..., W, H) -> (..., W, H, 3).
+    """
+    return numpy.repeat(map_[..., numpy.newaxis], 3, axis=-1)
+
+
+def magnitude(gx, gy, threshold=0):
+    """
+    The (..., W, H, 3) float64 array the run() methods produce.
+    """
+    return expand(edge_map(gx, gy, threshold))
+
+
+def luminance(array_):
+    """
+    Single channel uint8 luminance of a (..., W, H, 3) RGB array (ITU-R BT.601),
+    converted once for the compact mode. Gray images give back their channel.
+    """
+    array_ = numpy.asarray(array_, dtype=numpy.uint32)
+    weighted = array_[..., 0] * 299 + array_[..., 1] * 587 + array_[..., 2] * 114
+    return ((weighted + 500) // 1000).astype(numpy.uint8)
+
+
+def _blur_integer(block, w, h):
+    """
+    Exact integer 5x5 sum of a block (w + 4, h + 4), separable passes: the x pass
+    adds the symmetric pairs, the y pass applies the 3 rows of BLUR_ROWS.
+    uint8 data fits in uint16 (at most 159 * 255).
+    """
+    if block.dtype == numpy.uint8 or block.dtype == bool:
+        dtype = numpy.uint16
+    elif block.dtype.itemsize <= 2:
+        dtype = numpy.int32
+    else:
+        dtype = numpy.int64
+    block = block.astype(dtype)
+    pairs = (block[..., 0:w, :] + block[..., 4:w + 4, :],
+             block[..., 1:w + 1, :] + block[..., 3:w + 3, :],
+             block[..., 2:w + 2, :])
+    total = None
+    for column, (outer, inner, centre) in zip(pairs, BLUR_ROWS):
+        term = (column[..., 0:h] + column[..., 4:h + 4]) * dtype(outer)
+        term += (column[..., 1:h + 1] + column[..., 3:h + 3]) * dtype(inner)
+        term += column[..., 2:h + 2] * dtype(centre)
+        if total is None:
+            total = term
+        else:
+            total += term
+    return total
+
+
+def gaussian_blur_channel(channel, region=None, exact=True):
+    """
+    GaussianBlur5x5 of a (..., W, H) channel. With a region only the region plus a
+    2 pixels halo is read.
+    The products and the sums follow the order of the loops (sum(sum(data * kernel))),
+    bit-identical to GaussianBlur5x5.run(). With exact=False integer channels are
+    summed exactly with the integer kernel and divided once by 159, faster, the
+    correctly rounded value: it can differ from the loops by a few ulp (about 1e-13),
+    the values rounded to uint8 are identical.
+    """
+    if not hasattr(channel, 'shape'):
+        channel = numpy.asarray(channel)
+    width, height = channel.shape[-2:]
+    if region is None:
+        region = full_region(width, height)
+    x0, x1, y0, y1 = region
+    result = numpy.zeros(channel.shape[:-2] + (x1 - x0, y1 - y0))
+    inside = window(width, height, region)
+    if inside is None:
+        return result
+    wx0, wx1, wy0, wy1 = inside
+    block = numpy.asarray(channel[..., wx0 - 2:wx1 + 2, wy0 - 2:wy1 + 2])
+    w, h = wx1 - wx0, wy1 - wy0
+    if not exact and accumulator(block.dtype) is not numpy.float64:
+        result[..., wx0 - x0:wx1 - x0, wy0 - y0:wy1 - y0] = _blur_integer(block, w, h) / float(BLUR_NORM)
+        return result
+    block = block.astype(numpy.float64)
+    total = None
+    # sum() of the 5x5 products adds the rows (x) first, then the 5 partial sums (y)
+    for j in range(5):
+        column = block[..., 0:w, j:j + h] * BLUR_KERNEL[0, j]
+        for i in range(1, 5):
+            column += block[..., i:i + w, j:j + h] * BLUR_KERNEL[i, j]
+        if total is None:
+            total = column
+        else:
+            total += column
+    result[..., wx0 - x0:wx1 - x0, wy0 - y0:wy1 - y0] = total
+    return result
+
+
+def gaussian_blur(array_, region=None, exact=True):
+    """
+    GaussianBlur5x5 of a (..., W, H, 3) array, the 3 channels are blurred.
+    """
+    if not hasattr(array_, 'shape'):
+        array_ = numpy.asarray(array_)
+    return numpy.moveaxis(gaussian_blur_channel(numpy.moveaxis(array_, -1, 0), region, exact), 0, -1)
+
+
+def compute_region(source, target, operator, threshold, region, norm='exact', offset=(0, 0)):
+    """
+    Compute one region of the operator from source into target.
+    source is a (W, H) channel for the gradient operators. For 'blur' it is a
+    (W, H, 3) array or a (W, H) channel, blurred into the 3 channels of a
+    (W, H, 3) target.
+    target is the (W, H, 3) float64 output of run(), or a (W, H) compact map, or
+    a part of them starting at the pixel offset (x, y).
+    norm is the magnitude of the gradient operators, see NORMS.
+    """
+    x0, x1, y0, y1 = region
+    tx0, tx1, ty0, ty1 = x0 - offset[0], x1 - offset[0], y0 - offset[1], y1 - offset[1]
+    if operator == 'blur':
+        if target.ndim == 3 and source.ndim == 2:
+            target[tx0:tx1, ty0:ty1, :] = gaussian_blur_channel(source, region)[..., numpy.newaxis]
+        elif target.ndim == 3:
+            target[tx0:tx1, ty0:ty1, :] = gaussian_blur(source, region)
+        else:
+            # The integer sum rounds to the same uint8 values
+            values = gaussian_blur_channel(source, region, target.dtype != numpy.uint8)
+            target[tx0:tx1, ty0:ty1] = convert(values, target.dtype)
+    else:
+        values = operator_map(source, operator, threshold, region, target.dtype, norm)
+        if target.ndim == 3:
+            target[tx0:tx1, ty0:ty1, :] = values[..., numpy.newaxis]
+        else:
+            target[tx0:tx1, ty0:ty1] = values
+
+
+def rect_region(rect):
+    """
+    Region (x0, x1, y0, y1) of a rectangle (x, y, width, height) or pygame.Rect.
+    """
+    x, y, width, height = rect
+    return x, x + width, y, y + height
+
+
+def run_region(source, region, operator='sobel', threshold=None, compact=None, norm='exact'):
+    """
+    run() for a region (x0, x1, y0, y1) of the image only, clipped to the image.
+    Returns the (x1 - x0, y1 - y0, 3) float64 array or the compact map holding the
+    values the whole image gives, only the region plus the halo of the operator
+    is read.
+    """
+    width, height = source.shape[:2]
+    x0, x1, y0, y1 = region
+    x0, x1 = max(x0, 0), max(min(x1, width), max(x0, 0))
+    y0, y1 = max(y0, 0), max(min(y1, height), max(y0, 0))
+    if threshold is None and operator != 'blur':
+        threshold = OPERATORS[operator].threshold
+    if compact is None:
+        target = numpy.zeros((x1 - x0, y1 - y0, 3))
+    else:
+        target = numpy.zeros((x1 - x0, y1 - y0), dtype=compact)
+    if target.size:
+        compute_region(source, target, operator, threshold, (x0, x1, y0, y1), norm, (x0, y0))
+    return target
+
+
+def connected_components(mask):
+    """
+    Label the 8-connected components of a (..., W, H) boolean mask.
+    Returns the flat indices of the pixels set (C order) and, for each of them, the
+    label of its component.
+    The pixels are first grouped into runs along y (consecutive in memory), then a
+    union-find links the runs of neighbouring x lines: each round hooks the root of
+    every link whose ends still differ onto the smaller root and compresses the
+    paths by pointer jumping. No recursion, the links already settled are dropped
+    at each round, the cost stays close to linear.
+    """
+    before = numpy.zeros(mask.shape, dtype=bool)
+    before[..., 1:] = mask[..., :-1]
+    starts = mask & ~before
+    runs = numpy.cumsum(starts.reshape(-1)).reshape(mask.shape) - 1
+    count = int(runs.reshape(-1)[-1]) + 1 if mask.size else 0
+    dtype = numpy.int32 if count < 2 ** 31 else numpy.int64
+    runs = runs.astype(dtype)
+
+    # Links between the runs of the lines x and x + 1, (x, y) touches (x + 1, y + dy).
+    # Only the first link of a stretch is kept, the next ones join the same 2 runs.
+    first, second = [], []
+    for dy in (-1, 0, 1):
+        ys = slice(max(-dy, 0), mask.shape[-1] - max(dy, 0))
+        yd = slice(max(dy, 0), mask.shape[-1] - max(-dy, 0))
+        linked = mask[..., :-1, ys] & mask[..., 1:, yd]
+        linked[..., 1:] &= ~linked[..., :-1].copy()
+        first.append(runs[..., :-1, ys][linked])
+        second.append(runs[..., 1:, yd][linked])
+    a, b = numpy.concatenate(first), numpy.concatenate(second)
+
+    parent = numpy.arange(count, dtype=dtype)
+    while a.size:
+        root_a, root_b = parent[a], parent[b]
+        differ = root_a != root_b
+        a, b = a[differ], b[differ]
+        if not a.size:
+            break
+        root_a, root_b = root_a[differ], root_b[differ]
+        numpy.minimum.at(parent, numpy.maximum(root_a, root_b), numpy.minimum(root_a, root_b))
+        while True:
+            grand = parent[parent]
+            if numpy.array_equal(grand, parent):
+                break
+            parent = grand
+    index = numpy.flatnonzero(mask)
+    return index, parent[runs.reshape(-1)[index]]
+
+
+def hysteresis(map_, high, strong=None):
+    """
+    Edge tracking by hysteresis on a (..., W, H) map already cut at the low threshold:
+    the weak pixels (non zero) are kept only when their 8-connected component holds
+    a strong pixel (above high). Returns the boolean mask of the pixels kept.
+    The map is capped to 255, from high = 255 on the strong pixels are given by
+    strong, the boolean mask of the raw magnitudes above high.
+    """
+    if strong is None:
+        strong = map_ > high
+    candidates = map_ > 0
+    index, labels = connected_components(candidates)
+    seeded = numpy.zeros(labels.size, dtype=bool)
+    seeded[labels[strong.reshape(-1)[index]]] = True
+    keep = numpy.zeros(map_.shape, dtype=bool)
+    keep.reshape(-1)[index] = seeded[labels]
+    return keep
+
+
+def double_threshold(magnitude_, threshold, low_threshold, dtype=numpy.float64):
+    """
+    Edge map of a raw magnitude (magnitude_region) with a double threshold: the pixels
+    above low_threshold are kept when their 8-connected component holds a pixel above
+    threshold. Both masks come from the raw values, the map is then capped to 255 and
+    cast to dtype like threshold_map(). magnitude_ is overwritten.
+    """
+    strong = magnitude_ > threshold
+    map_ = threshold_map(magnitude_, low_threshold, magnitude_.dtype, copy=False)
+    map_[~hysteresis(map_, threshold, strong)] = 0
+    return convert(map_, dtype)
+
+
+def run(source, operator='sobel', threshold=None, workers=None, compact=None, low_threshold=None,
+        norm='exact'):
+    """
+    Output of an operator for the whole image, what the vectorized run() methods return.
+    source is a (W, H) channel for the gradient operators, a (W, H, 3) array or a
+    (W, H) channel for 'blur' (a channel in compact mode).
+    compact None gives the (W, H, 3) float64 array of run(), numpy.uint8 or
+    numpy.float32 a single channel map of that dtype (6 to 24 times smaller).
+    workers splits the image into tiles over a process pool (Parallel.py).
+    low_threshold turns threshold into the high one of a double threshold, the
+    pixels between the two are kept when connected to a pixel above threshold. The
+    hysteresis follows the edges over the whole image, it runs on a single core.
+    norm selects the magnitude of the gradient, one of NORMS.
+    """
+    if threshold is None and operator != 'blur':
+        threshold = OPERATORS[operator].threshold
+    if low_threshold is not None:
+        dtype = numpy.float64 if compact is None else compact
+        map_ = double_threshold(magnitude_region(source, operator, None, dtype, norm, low_threshold),
+                                threshold, low_threshold, dtype)
+        return expand(map_) if compact is None else map_
+    if workers:
+        import Parallel
+        return Parallel.run_parallel(source, operator, threshold, workers, compact=compact, norm=norm)
+    width, height = source.shape[:2]
+    if compact is None:
+        target = numpy.zeros((width, height, 3))
+    else:
+        target = numpy.zeros((width, height), dtype=compact)
+    compute_region(source, target, operator, threshold, full_region(width, height), norm)
+    return target
+
+
+def run_direction(source, operator='sobel', threshold=None, direction_='radians', compact=None,
+                  norm='exact'):
+    """
+    run() and the gradient direction from the same Gx and Gy, the gradient is computed
+    once. direction_ is 'radians' (float64) or a number of bins (uint8), see direction().
+    Returns (edge map, direction), the direction is a (W, H) array.
+    """
+    if threshold is None:
+        threshold = OPERATORS[operator].threshold
+    gx, gy = gradient(source, operator)
+    map_ = edge_map(gx, gy, threshold, numpy.float64 if compact is None else compact,
+                    OPERATORS[operator].suppression, norm)
+    angles = direction(gx, gy, None if direction_ == 'radians' else direction_)
+    return (expand(map_) if compact is None else map_), angles
+
+
+def per_pixel(surface, shape, gx, gy, kernel_half, threshold):
+    """
+    The original per-pixel loop of Sobel4, Prewitt and Canny (vectorized=False),
+    kept as the reference of the engine. The pixels are read with surface.get_at(),
+    the products of gx with kernel_offset_x == 0 and of gy with kernel_offset_y == 0
+    are skipped.
+    """
+    source_array = numpy.zeros((shape[0], shape[1], 3))
+    for y in range(2, shape[1] - 2):
+
+        for x in range(2, shape[0] - 2):
+            r_gx, r_gy = 0, 0
+            for kernel_offset_y in range(-kernel_half, kernel_half + 1):
+
+                for kernel_offset_x in range(-kernel_half, kernel_half + 1):
+
+                    color = surface.get_at((x + kernel_offset_x, y + kernel_offset_y))
+                    if kernel_offset_x != 0:
+                        k = gx[kernel_offset_x + kernel_half, kernel_offset_y + kernel_half]
+                        r_gx += color[0] * k
+
+                    if kernel_offset_y != 0:
+                        k = gy[kernel_offset_x + kernel_half, kernel_offset_y + kernel_half]
+                        r_gy += color[0] * k
+
+            magnitude_ = math.sqrt(r_gx ** 2 + r_gy ** 2)
+            # update the pixel if the magnitude is above threshold else black pixel
+            source_array[x, y] = magnitude_ if magnitude_ > threshold else 0
+    # cap the values
+    numpy.putmask(source_array, source_array > 255, 255)
+    numpy.putmask(source_array, source_array < 0, 0)
+    return source_array
+
+
+def red_channel(surface):
+    """
+    Channel 0 of a pygame Surface, the pixels surface.get_at()[0] returns. A zero-copy
+    view (pygame.surfarray.pixels_red) when the pixel format allows it, a copy otherwise.
+    """
+    import pygame
+    try:
+        return pygame.surfarray.pixels_red(surface)
+    except ValueError:
+        return pygame.surfarray.array_red(surface)
+
+
+def read_channel(surface, array_):
+    """
+    Channel the classes read: the red channel of the Surface, or the channel 0 of
+    array_ when there is no Surface (surface None), without importing pygame.
+    """
+    if surface is None:
+        return array_ if array_.ndim == 2 else array_[:, :, 0]
+    return red_channel(surface)
+
+
+def to_surface(array_):
+    """
+    pygame Surface of a run() output, compact maps are expanded to RGB only here.
+    """
+    import pygame
+    array_ = numpy.asarray(array_)
+    if array_.ndim == 2:
+        array_ = expand(array_)
+    return pygame.surfarray.make_surface(array_)
+
+
+def run_batch(stack, operator='sobel', threshold=None):
+    """
+    Apply an operator to a stack of same-sized images in one vectorized call.
+    stack is (N, W, H) or (N, W, H, 3) (pygame.surfarray.array3d images stacked
+    on the first axis, only the channel 0 is read like the classes do).
+    Returns the N gradient maps as a (N, W, H, 3) float64 array, map i is identical
+    to the run() output of the operator for image i.
+    """
+    stack = numpy.asarray(stack)
+    if stack.ndim == 4:
+        stack = stack[..., 0]
+    elif stack.ndim != 3:
+        raise ValueError('Expecting a (N, W, H) or (N, W, H, 3) array, got shape %s' % (stack.shape,))
+    return expand(operator_map(stack, operator, threshold))
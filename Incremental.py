@@ -0,0 +1,125 @@
+"""
+Incremental recomputation for video / frame mode.
+
+Each frame is compared with the previous one, the changed pixels are grown by the
+kernel halo (an output pixel reads its neighbours up to 1 pixel away, 2 for the
+5x5 blur) and only the blocks touched are recomputed. The rest of the previous
+edge map is reused. The result is identical to a full run() on the frame.
+
+    stream = Incremental('sobel', threshold=0)
+    while True:
+        array = stream.run(pygame.surfarray.array3d(SCREEN))
+        print(stream.recomputed)
+"""
+
+import numpy
+
+import Engine
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+
+def dilate(mask, radius):
+    """
+    Grow a (W, H) boolean mask by radius pixels in every direction (square window).
+    """
+    grown = mask.copy()
+    for axis in (0, 1):
+        source = grown.copy()
+        for shift in range(1, radius + 1):
+            if axis == 0:
+                grown[shift:] |= source[:-shift]
+                grown[:-shift] |= source[shift:]
+            else:
+                grown[:, shift:] |= source[:, :-shift]
+                grown[:, :-shift] |= source[:, shift:]
+    return grown
+
+
+def dirty_blocks(mask, block):
+    """
+    Reduce a (W, H) mask to the grid of block x block tiles, True when any
+    pixel of the tile is set.
+    """
+    width, height = mask.shape
+    columns, rows = -(-width // block), -(-height // block)
+    padded = numpy.zeros((columns * block, rows * block), dtype=bool)
+    padded[:width, :height] = mask
+    return padded.reshape(columns, block, rows, block).any(axis=(1, 3))
+
+
+def block_regions(grid, block, width, height):
+    """
+    Regions (x0, x1, y0, y1) of the dirty tiles, consecutive tiles of a column
+    are merged into a single region.
+    """
+    regions = []
+    for column in range(grid.shape[0]):
+        row = 0
+        while row < grid.shape[1]:
+            if not grid[column, row]:
+                row += 1
+                continue
+            start = row
+            while row < grid.shape[1] and grid[column, row]:
+                row += 1
+            regions.append((column * block, min((column + 1) * block, width),
+                            start * block, min(row * block, height)))
+    return regions
+
+
+class Incremental:
+    """
+    Frame-streaming mode of an operator (a name of Engine.OPERATORS or 'blur').
+    """
+
+    def __init__(self, operator='sobel', threshold=None, block=32):
+        self.operator = operator
+        if threshold is None and operator != 'blur':
+            threshold = Engine.OPERATORS[operator].threshold
+        self.threshold = threshold
+        self.block = block
+        self.previous = None
+        self.source_array = None
+        # Fraction of the pixels recomputed and number of dirty blocks for the last frame
+        self.recomputed = 0.0
+        self.dirty_blocks = 0
+
+    def run(self, frame):
+        """
+        Edge map of the frame, a (W, H, 3) float64 array updated in place from one
+        frame to the next. The gradient operators read the channel 0 of a (W, H, 3)
+        frame (or a (W, H) channel), 'blur' reads the 3 channels.
+        """
+        frame = numpy.asarray(frame)
+        if self.operator != 'blur' and frame.ndim == 3:
+            frame = frame[..., 0]
+        width, height = frame.shape[:2]
+
+        if self.previous is None or self.previous.shape != frame.shape:
+            # First frame, everything is recomputed
+            self.source_array = numpy.zeros((width, height, 3))
+            self.previous = numpy.empty_like(frame)
+            grid = numpy.ones((-(-width // self.block), -(-height // self.block)), dtype=bool)
+        else:
+            changed = frame != self.previous
+            if changed.ndim == 3:
+                changed = changed.any(axis=-1)
+            grid = dirty_blocks(dilate(changed, Engine.halo(self.operator)), self.block)
+
+        regions = block_regions(grid, self.block, width, height)
+        for region in regions:
+            Engine.compute_region(frame, self.source_array, self.operator, self.threshold, region)
+        self.previous[...] = frame
+
+        self.dirty_blocks = int(grid.sum())
+        pixels = sum((x1 - x0) * (y1 - y0) for x0, x1, y0, y1 in regions)
+        self.recomputed = pixels / float(max(width * height, 1))
+        return self.source_array
@@ -0,0 +1,259 @@
+"""
+Per-stage instrumentation of the operators.
+
+Subscribing a callback wraps the stages of the engine (blur, gradient, magnitude,
+suppression, direction, hysteresis, conversions), the run() methods of the
+classes, the cache lookups and the incremental runs. Every call then sends an
+Event with its wall time, the pixels and the bytes of its output (not the memory
+allocated inside the stage) and its counters (cache hits and misses, pixels recomputed by Incremental).
+Without subscriber the original functions are put back, the instrumentation
+costs nothing when it is not used.
+
+    with profile() as report:
+        Canny(surface, array3d, vectorized=True).run()
+    print(report.summary())
+    metrics.send(report.as_dict())
+"""
+
+import importlib
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+# (module, function, stage) of the module functions wrapped
+FUNCTIONS = (
+    ('Engine', 'gaussian_blur_channel', 'blur'),
+    ('Engine', 'gradient', 'gradient'),
+    ('Engine', 'edge_map', 'magnitude'),
+    ('Engine', 'raw_magnitude', 'magnitude'),
+    ('Engine', 'non_maximum_suppression', 'suppression'),
+    ('Engine', 'direction', 'direction'),
+    ('Engine', 'hysteresis', 'hysteresis'),
+    ('Engine', 'red_channel', 'conversion'),
+    ('Engine', 'to_surface', 'conversion'),
+    ('Engine', 'expand', 'conversion'),
+    ('Engine', 'convert', 'conversion'),
+    ('Engine', 'luminance', 'conversion'),
+    ('Engine', 'run', 'engine'),
+    ('Parallel', 'run_parallel', 'parallel'),
+)
+
+# (module, class, method, stage) of the methods wrapped, None for ClassName.method
+METHODS = (
+    ('Sobel', 'Sobel', 'run', None),
+    ('Sobel', 'Sobel2', 'run', None),
+    ('Sobel', 'Sobel3', 'run', None),
+    ('Sobel', 'Sobel4', 'run', None),
+    ('Prewitt', 'Prewitt', 'run', None),
+    ('Canny', 'GaussianBlur5x5', 'run', None),
+    ('Canny', 'Canny', 'run', None),
+    ('Cache', 'Cache', 'get', 'cache'),
+    ('Incremental', 'Incremental', 'run', 'incremental'),
+)
+
+# stage: wall time including the nested stages, self_seconds without them.
+# output_bytes is the nbytes of the arrays returned, parent the stage of the enclosing
+# call (None at the top), counters a dict.
+Event = namedtuple('Event', 'stage seconds self_seconds pixels output_bytes depth parent counters')
+
+
+def _cache_counters(arguments, result):
+    return {'hits': int(result is not None), 'misses': int(result is None)}
+
+
+def _incremental_counters(arguments, result):
+    stream = arguments[0]
+    return {'recomputed_pixels': int(round(stream.recomputed * _pixels(result)))}
+
+
+COUNTERS = {
+    'cache': _cache_counters,
+    'incremental': _incremental_counters,
+}
+
+_observers = []
+_originals = []
+_local = threading.local()
+
+
+def _pixels(value):
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, numpy.ndarray):
+        if value.ndim >= 3 and value.shape[-1] in (3, 4):
+            return value.size // value.shape[-1]
+        return value.size
+    if hasattr(value, 'get_size'):
+        width, height = value.get_size()
+        return width * height
+    return 0
+
+
+def _output_bytes(value):
+    if isinstance(value, tuple):
+        return sum(_output_bytes(item) for item in value)
+    return value.nbytes if isinstance(value, numpy.ndarray) else 0
+
+
+def _wrap(function, stage):
+    counters = COUNTERS.get(stage)
+
+    def wrapper(*arguments, **keywords):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        parent = stack[-1][0] if stack else None
+        # [stage, time spent in the nested stages]
+        frame = [stage, 0.0]
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            result = function(*arguments, **keywords)
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][1] += seconds
+        event = Event(stage, seconds, seconds - frame[1], _pixels(result), _output_bytes(result),
+                      len(stack), parent, counters(arguments, result) if counters is not None else {})
+        for observer in list(_observers):
+            observer(event)
+        return result
+
+    wrapper.__wrapped__ = function
+    wrapper.__name__ = getattr(function, '__name__', stage)
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+def _install():
+    for module_name, name, stage in FUNCTIONS:
+        module = importlib.import_module(module_name)
+        original = getattr(module, name)
+        _originals.append((module, name, original))
+        setattr(module, name, _wrap(original, stage))
+    for module_name, class_name, name, stage in METHODS:
+        class_ = getattr(importlib.import_module(module_name), class_name)
+        original = class_.__dict__[name]
+        _originals.append((class_, name, original))
+        setattr(class_, name, _wrap(original, stage or '%s.%s' % (class_name, name)))
+
+
+def _uninstall():
+    while _originals:
+        owner, name, original = _originals.pop()
+        setattr(owner, name, original)
+
+
+def subscribe(observer):
+    """
+    Send the events to observer(event), the stages are wrapped with the first one.
+    """
+    if not _observers:
+        _install()
+    _observers.append(observer)
+    return observer
+
+
+def unsubscribe(observer):
+    """
+    Stop sending the events to observer, the original functions are restored with
+    the last one.
+    """
+    _observers.remove(observer)
+    if not _observers:
+        _uninstall()
+
+
+def enabled():
+    return bool(_observers)
+
+
+class Report:
+    """
+    Observer aggregating the events per stage: calls, wall time (with and without
+    the nested stages), pixels, output bytes and counters. A stage called inside the same
+    stage only adds its self time.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.seconds = 0.0
+
+    def __call__(self, event):
+        entry = self.stages.get(event.stage)
+        if entry is None:
+            entry = self.stages[event.stage] = {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0,
+                                                'pixels': 0, 'output_bytes': 0, 'counters': {}}
+        entry['self_seconds'] += event.self_seconds
+        if event.depth == 0:
+            self.seconds += event.seconds
+        if event.parent == event.stage:
+            return
+        entry['calls'] += 1
+        entry['seconds'] += event.seconds
+        entry['pixels'] += event.pixels
+        entry['output_bytes'] += event.output_bytes
+        for name, value in event.counters.items():
+            entry['counters'][name] = entry['counters'].get(name, 0) + value
+
+    def as_dict(self):
+        """
+        JSON-friendly report, per stage the totals plus the pixels per second and,
+        for the cache and the incremental runs, the hit rate (the fraction of the
+        lookups found or of the pixels reused).
+        """
+        stages = {}
+        for stage, entry in self.stages.items():
+            entry = dict(entry, counters=dict(entry['counters']))
+            entry['pixels_per_second'] = entry['pixels'] / entry['seconds'] if entry['seconds'] else 0.0
+            counters = entry['counters']
+            if 'hits' in counters:
+                lookups = counters['hits'] + counters['misses']
+                entry['hit_rate'] = counters['hits'] / float(lookups) if lookups else 0.0
+            if 'recomputed_pixels' in counters:
+                entry['hit_rate'] = 1.0 - counters['recomputed_pixels'] / float(entry['pixels']) \
+                    if entry['pixels'] else 0.0
+            stages[stage] = entry
+        return {'seconds': self.seconds, 'stages': stages}
+
+    def summary(self):
+        """
+        One line per stage, the slowest (self time) first.
+        """
+        report = self.as_dict()
+        lines = ['%-24s %6s %10s %10s %12s %10s' % ('stage', 'calls', 'total s', 'self s', 'pixels', 'out MB')]
+        for stage, entry in sorted(report['stages'].items(), key=lambda item: -item[1]['self_seconds']):
+            line = '%-24s %6d %10.4f %10.4f %12d %10.1f' % (stage, entry['calls'], entry['seconds'],
+                                                            entry['self_seconds'], entry['pixels'],
+                                                            entry['output_bytes'] / 1048576.0)
+            if 'hit_rate' in entry:
+                line += '  hit rate %.1f %%' % (entry['hit_rate'] * 100)
+            lines.append(line)
+        lines.append('total %.4f s' % report['seconds'])
+        return '\n'.join(lines)
+
+
+@contextmanager
+def profile(report=None):
+    """
+    Collect the events of the block into a Report.
+    """
+    report = Report() if report is None else report
+    subscribe(report)
+    try:
+        yield report
+    finally:
+        unsubscribe(report)
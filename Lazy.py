@@ -0,0 +1,143 @@
+"""
+Lazy edge map.
+
+LazyEdgeMap computes nothing when it is created, the image is split into square
+tiles computed (Engine.run_region) and kept the first time a pixel of the tile is
+read. A viewer scrolling over a large picture, or a program looking at a few
+rectangles only, pays for the tiles it reads.
+
+    edges = LazyEdgeMap(pygame.surfarray.array_red(surface), 'canny', compact=numpy.uint8)
+    view = edges[100:900, 50:650]
+    print(edges.computed_fraction())
+"""
+
+import numpy
+
+import Engine
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+# Tile side in pixels
+TILE = 256
+
+
+class LazyEdgeMap:
+    """
+    Edge map of source computed tile by tile on access, reading it returns the
+    values of Engine.run(source, operator, threshold, compact=compact, norm=norm).
+    source is a (W, H) channel, or a (W, H, 3) array (the channel 0 is read by the
+    gradient operators). The hysteresis needs the whole image and is not available.
+    """
+
+    def __init__(self, source, operator='sobel', threshold=None, compact=None, norm='exact', tile=TILE):
+        if operator != 'blur':
+            if operator not in Engine.OPERATORS:
+                raise ValueError('Unknown operator %r' % operator)
+            if norm not in Engine.NORMS:
+                raise ValueError('norm must be one of %s, got %r' % (Engine.NORMS, norm))
+            if source.ndim == 3:
+                source = source[:, :, 0]
+        elif compact is not None and source.ndim == 3:
+            source = source[:, :, 0]
+        self.source = source
+        self.operator = operator
+        self.threshold = threshold
+        self.compact = compact
+        self.norm = norm
+        self.tile = tile
+        self.width, self.height = source.shape[:2]
+        self.shape = (self.width, self.height) if compact is not None else (self.width, self.height, 3)
+        self.dtype = numpy.float64 if compact is None else numpy.dtype(compact)
+        # (column, row) -> computed tile
+        self.tiles = {}
+
+    def _tile(self, column, row):
+        key = (column, row)
+        block = self.tiles.get(key)
+        if block is None:
+            x0, y0 = column * self.tile, row * self.tile
+            block = Engine.run_region(self.source, (x0, x0 + self.tile, y0, y0 + self.tile), self.operator,
+                                      self.threshold, self.compact, self.norm)
+            self.tiles[key] = block
+        return block
+
+    def region(self, x0, x1, y0, y1):
+        """
+        Values of the region (x0, x1, y0, y1), clipped to the image, computing the
+        missing tiles it covers.
+        """
+        x0, x1 = max(x0, 0), max(min(x1, self.width), max(x0, 0))
+        y0, y1 = max(y0, 0), max(min(y1, self.height), max(y0, 0))
+        target = numpy.empty((x1 - x0, y1 - y0) + self.shape[2:], dtype=self.dtype)
+        if not target.size:
+            return target
+        for column in range(x0 // self.tile, (x1 - 1) // self.tile + 1):
+            tx0 = column * self.tile
+            a0, a1 = max(x0, tx0), min(x1, tx0 + self.tile)
+            for row in range(y0 // self.tile, (y1 - 1) // self.tile + 1):
+                ty0 = row * self.tile
+                b0, b1 = max(y0, ty0), min(y1, ty0 + self.tile)
+                target[a0 - x0:a1 - x0, b0 - y0:b1 - y0] = \
+                    self._tile(column, row)[a0 - tx0:a1 - tx0, b0 - ty0:b1 - ty0]
+        return target
+
+    def viewport(self, rect):
+        """
+        Values of a rectangle (x, y, width, height) or pygame.Rect.
+        """
+        return self.region(*Engine.rect_region(rect))
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > len(self.shape) or any(index is Ellipsis for index in key):
+            raise IndexError('LazyEdgeMap takes up to %d indices, no Ellipsis' % len(self.shape))
+        key = key + (slice(None),) * (2 - len(key))
+        x, y = key[0], key[1]
+        bounds = []
+        for index, size in ((x, self.width), (y, self.height)):
+            if isinstance(index, slice):
+                start, stop, step = index.indices(size)
+                if step < 0:
+                    # Negative steps: read the covered range, the step is applied below
+                    start, stop = stop + 1, start + 1
+                bounds.append((start, max(stop, start), index.step))
+            else:
+                index = int(index)
+                if index < 0:
+                    index += size
+                if not 0 <= index < size:
+                    raise IndexError('index %d out of range for size %d' % (index, size))
+                bounds.append((index, index + 1, None))
+        (x0, x1, xs), (y0, y1, ys) = bounds
+        values = self.region(x0, x1, y0, y1)
+        selection = tuple(slice(None, None, step) if isinstance(index, slice) else 0
+                          for index, step in ((x, xs), (y, ys))) + key[2:]
+        return values[selection]
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.region(0, self.width, 0, self.height)
+        return values if dtype is None else values.astype(dtype)
+
+    def computed(self):
+        """
+        Number of pixels of the computed tiles.
+        """
+        return sum(block.shape[0] * block.shape[1] for block in self.tiles.values())
+
+    def computed_fraction(self):
+        pixels = self.width * self.height
+        return self.computed() / float(pixels) if pixels else 1.0
+
+    def clear(self):
+        """
+        Forget the computed tiles, after the source changed.
+        """
+        self.tiles.clear()
@@ -0,0 +1,103 @@
+"""
+Out-of-core processing of images larger than the memory.
+
+The source is a numpy.memmap (or a raw / .npy file opened as one), it is processed
+by bands of the first axis (x in the surfarray layout, the contiguous one in a
+C-order file). A band is read with the halo of the operator, 1 pixel for Sobel and
+Prewitt, 2 for GaussianBlur5x5 and 4 for GaussianBlur5x5 followed by Canny, and
+its result is written straight into a memory-mapped .npy output file.
+The peak memory depends on the band size, not on the image size, and the result
+is identical to the in-memory one.
+
+    source = open_source('scan.raw', shape=(40000, 30000))
+    edges = run_out_of_core(source, 'scan_edges.npy', 'blur+canny', compact=numpy.uint8)
+"""
+
+import numpy
+
+import Engine
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+# Band width (first axis) in pixels
+BAND = 256
+
+
+def open_source(path, shape=None, dtype=numpy.uint8):
+    """
+    Read-only memory map of an image file, a .npy file or a raw file of the given
+    shape and dtype.
+    """
+    if path.endswith('.npy'):
+        return numpy.load(path, mmap_mode='r')
+    if shape is None:
+        raise ValueError('A raw file needs its shape')
+    return numpy.memmap(path, dtype=dtype, mode='r', shape=tuple(shape))
+
+
+def bands(width, band=BAND):
+    """
+    (x0, x1) ranges of the first axis.
+    """
+    return [(x, min(x + band, width)) for x in range(0, width, band)]
+
+
+def _blur_canny(channel, region, threshold, dtype):
+    """
+    GaussianBlur5x5 then Canny for one band. The blur is computed over the band plus
+    2 pixels and Canny runs on that block, the block starts at x = 0 or 2 pixels
+    before the band, so its own border matches the one of the image.
+    """
+    width = channel.shape[0]
+    x0, x1, y0, y1 = region
+    bx0, bx1 = max(x0 - 2, 0), min(x1 + 2, width)
+    blurred = Engine.gaussian_blur_channel(channel, (bx0, bx1, y0, y1))
+    gx, gy = Engine.gradient(blurred, 'canny', (x0 - bx0, x1 - bx0, 0, y1 - y0))
+    return Engine.edge_map(gx, gy, threshold, dtype)
+
+
+def run_out_of_core(source, output_path, operator='sobel', threshold=None, compact=None, band=BAND):
+    """
+    Run an operator over a memory-mapped source band by band, the result is written
+    into output_path (.npy) and returned as a memory map.
+    source is a (W, H) channel or a (W, H, 3) array (the channel 0 is read by the
+    gradient operators), 'blur' reads the 3 channels ((W, H) in compact mode).
+    operator is a name of Engine.OPERATORS, 'blur' or 'blur+canny'.
+    compact None writes the (W, H, 3) float64 array of run(), numpy.uint8 or
+    numpy.float32 a single channel map.
+    """
+    if operator == 'blur':
+        if compact is not None and source.ndim == 3:
+            source = source[..., 0]
+    else:
+        if source.ndim == 3:
+            # A view, nothing is read yet
+            source = source[..., 0]
+        if threshold is None:
+            threshold = Engine.OPERATORS['canny' if operator == 'blur+canny' else operator].threshold
+    width, height = source.shape[:2]
+    if compact is None:
+        shape, dtype = (width, height, 3), numpy.float64
+    else:
+        shape, dtype = (width, height), numpy.dtype(compact)
+    target = numpy.lib.format.open_memmap(output_path, mode='w+', dtype=dtype, shape=shape)
+
+    for x0, x1 in bands(width, band):
+        region = (x0, x1, 0, height)
+        if operator == 'blur+canny':
+            values = _blur_canny(source, region, threshold, dtype)
+            if target.ndim == 3:
+                target[x0:x1, :, :] = values[..., numpy.newaxis]
+            else:
+                target[x0:x1, :] = values
+        else:
+            Engine.compute_region(source, target, operator, threshold, region)
+    target.flush()
+    return target
@@ -0,0 +1,132 @@
+"""
+Tiled parallel execution of the operators.
+
+The image is cut into tiles, each tile is computed by a worker process with the
+vectorized engine (Engine.py). The input and the output live in shared memory, a
+worker reads its tile plus the kernel halo (1 pixel for the 3x3 kernels, 2 pixels
+for GaussianBlur5x5) and writes its result in place into the output, the tiles are
+stitched without any copy. The output is returned in its shared memory (released
+when the array is collected), the input is copied once into shared memory. The
+result is identical to the single-core run().
+
+    edges = run_parallel(pygame.surfarray.array_red(surface), 'sobel', workers=8)
+    blurred = run_parallel(pygame.surfarray.array3d(surface), 'blur', workers=8)
+"""
+
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy
+
+import Engine
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+# Tile width and height in pixels
+TILE = 1024
+
+# Shared arrays of the worker process, set by _initializer
+_SOURCE = None
+_TARGET = None
+_SEGMENTS = []
+
+
+def tiles(width, height, tile=TILE):
+    """
+    Regions (x0, x1, y0, y1) covering a width x height image.
+    """
+    return [(x, min(x + tile, width), y, min(y + tile, height))
+            for y in range(0, height, tile) for x in range(0, width, tile)]
+
+
+def _shared_array(shape, dtype):
+    segment = shared_memory.SharedMemory(create=True, size=max(int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize, 1))
+    return segment, numpy.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+
+def _attach(description):
+    name, shape, dtype = description
+    segment = shared_memory.SharedMemory(name=name)
+    _SEGMENTS.append(segment)
+    return numpy.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+
+def _initializer(source, target):
+    global _SOURCE, _TARGET
+    _SOURCE = _attach(source)
+    _TARGET = _attach(target)
+
+
+def _worker(operator, threshold, norm, region):
+    Engine.compute_region(_SOURCE, _TARGET, operator, threshold, region, norm)
+
+
+def run_parallel(array_, operator='sobel', threshold=None, workers=None, tile=TILE, compact=None,
+                 norm='exact'):
+    """
+    Run an operator over a process pool, tile by tile.
+    array_ is a (W, H) channel for the gradient operators (Engine.OPERATORS) or a
+    (W, H, 3) array or a (W, H) channel for 'blur' (a channel in compact mode).
+    workers defaults to the number of cores.
+    Returns the (W, H, 3) float64 array of the corresponding run() method, or a
+    (W, H) map of the compact dtype (numpy.uint8 or numpy.float32), held in the
+    shared memory the workers wrote.
+    """
+    array_ = numpy.asarray(array_)
+    if operator == 'blur':
+        if array_.ndim not in (2, 3) or (compact and array_.ndim != 2):
+            raise ValueError('blur expects a (W, H, 3) array or a (W, H) channel, '
+                             'got shape %s' % (array_.shape,))
+    elif array_.ndim != 2:
+        raise ValueError('%s expects a (W, H) channel, got shape %s' % (operator, array_.shape))
+    elif threshold is None:
+        threshold = Engine.OPERATORS[operator].threshold
+    width, height = array_.shape[:2]
+    if compact is None:
+        shape, dtype = (width, height, 3), numpy.float64
+    else:
+        shape, dtype = (width, height), numpy.dtype(compact)
+    regions = tiles(width, height, tile)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(regions))
+
+    if workers <= 1:
+        target = numpy.zeros(shape, dtype=dtype)
+        for region in regions:
+            Engine.compute_region(array_, target, operator, threshold, region, norm)
+        return target
+
+    source_segment, source = _shared_array(array_.shape, array_.dtype)
+    target_segment, target = _shared_array(shape, dtype)
+    try:
+        source[...] = array_
+        initargs = ((source_segment.name, source.shape, source.dtype),
+                    (target_segment.name, target.shape, target.dtype))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initializer,
+                                 initargs=initargs) as executor:
+            # list() re-raises the exceptions of the workers
+            list(executor.map(_worker, [operator] * len(regions), [threshold] * len(regions),
+                              [norm] * len(regions), regions))
+    except BaseException:
+        del target
+        target_segment.close()
+        raise
+    finally:
+        del source
+        source_segment.close()
+        source_segment.unlink()
+        # The name goes, the memory stays mapped for the returned array
+        target_segment.unlink()
+    # Unmapped once the array and its views are collected
+    weakref.finalize(target, target_segment.close)
+    return target
@@ -1,8 +1,8 @@
 
-import pygame
 import numpy
-import time
-import math
+
+import Engine
+from Vectorized import Vectorized
 
 __author__ = "Yoann Berenguer"
 __copyright__ = "Copyright 2007."
@@ -14,7 +14,7 @@ __email__ = "yoyoberenguer@hotmail.com"
 __status__ = "Demo"
 
 
-class Prewitt:
+class Prewitt(Vectorized):
     """
     WIKIPEDIA
     The Prewitt operator is used in image processing,
@@ -32,7 +32,10 @@ class Prewitt:
     The Prewitt operator was developed by Judith M. S. Prewitt.
     """
 
-    def __init__(self, surface_, array_):
+    # The loop skips the products of the middle row and column (see Engine.CORNERS_SMOOTH)
+    operator = 'prewitt_corners'
+
+    def __init__(self, surface_, array_, vectorized=False):
 
         self.gx = numpy.array(([-1, 0, 1],
                                [-1, 0, 1],
@@ -41,47 +44,24 @@ class Prewitt:
                                [0, 0, 0],
                                [1, 1, 1]))
         self.kernel_half = 1
-        self.surface = surface_
-        self.shape = array_.shape
-        self.array = array_
-        self.source_array = numpy.zeros((self.shape[0], self.shape[1], 3))
+        self._settings(surface_, array_, vectorized)
         self.threshold = 0
 
     def run(self):
 
-        for y in range(2, self.shape[1]-2):
-
-            for x in range(2, self.shape[0]-2):
-                r_gx, r_gy = 0, 0
-                for kernel_offset_y in range(-self.kernel_half, self.kernel_half + 1):
-
-                    for kernel_offset_x in range(-self.kernel_half, self.kernel_half + 1):
-
-                        xx = x + kernel_offset_x
-                        yy = y + kernel_offset_y
-                        color = self.surface.get_at((xx, yy))
-                        # print(kernel_offset_y, kernel_offset_x)
-                        if kernel_offset_x != 0:
-
-                            k = self.gx[kernel_offset_x + self.kernel_half,
-                                        kernel_offset_y + self.kernel_half]
-                            r_gx += color[0] * k
+        if self.engine():
+            return self.run_engine()
 
-                        if kernel_offset_y != 0:
-                            k = self.gy[kernel_offset_x + self.kernel_half,
-                                        kernel_offset_y + self.kernel_half]
-                            r_gy += color[0] * k
-
-                magnitude = math.sqrt(r_gx ** 2 + r_gy ** 2)
-                # update the pixel if the magnitude is above threshold else black pixel
-                self.source_array[x, y] = magnitude if magnitude > self.threshold else 0
-        # cap the values
-        numpy.putmask(self.source_array, self.source_array > 255, 255)
-        numpy.putmask(self.source_array, self.source_array < 0, 0)
+        self.source_array = Engine.per_pixel(self.surface, self.shape, self.gx, self.gy,
+                                             self.kernel_half, self.threshold)
         return self.source_array
 
 
 if __name__ == '__main__':
+    import pygame
+
+    from Background import Background
+
     numpy.set_printoptions(threshold=numpy.nan)
 
     SIZE = (800, 600)
@@ -96,6 +76,11 @@ if __name__ == '__main__':
     pygame.display.set_caption('Prewitt algorithm')
     Prw = Prewitt(TEXTURE1, pygame.surfarray.array3d(TEXTURE1))
 
+    # The edge maps are computed by a worker thread, the window keeps responding
+    DRIVER = Background(Prw)
+    SHOWN = 0
+    surface = None
+
     FRAME = 0
     clock = pygame.time.Clock()
     STOP_GAME = False
@@ -129,18 +114,22 @@ if __name__ == '__main__':
                 PAUSE = True
                 print('Paused')
 
-        t = time.time()
-        array = Prw.run()
-        print(time.time() - t)
-
-        surface = pygame.surfarray.make_surface(array)
+        if not DRIVER.busy():
+            DRIVER.submit()
+        if DRIVER.frame != SHOWN:
+            # A new edge map is in the front buffer
+            SHOWN = DRIVER.frame
+            print(DRIVER.seconds)
+            surface = pygame.surfarray.make_surface(DRIVER.front)
 
         SCREEN.fill((0, 0, 0, 0))
         SCREEN.blit(TEXTURE1, (0, 0))
-        SCREEN.blit(surface, (0, SIZE[1] // 2))
+        if surface is not None:
+            SCREEN.blit(surface, (0, SIZE[1] // 2))
 
         pygame.display.flip()
         TIME_PASSED_SECONDS = clock.tick(120)
         FRAME += 1
 
+    DRIVER.close()
     pygame.quit()
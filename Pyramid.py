@@ -0,0 +1,273 @@
+"""
+Coarse-to-fine edge detection on an image pyramid.
+
+On large and mostly flat pictures most of the gradient work lands on pixels with
+no edge. Pyramid looks at the image block by block at a coarse scale first and
+runs the operator at full resolution only in the blocks that may hold an edge.
+
+exact=True rejects a block from the range of its pixels (min / max of the block
+plus the kernel halo): the gradient of a kernel summing to zero is at most the
+sum of its positive weights times the range, a block whose bound is not above
+the threshold has no edge and the map is the one of Engine.run.
+exact=False is declared approximate: the blocks are selected from the gradient
+of the image downsampled levels times, faint fine textures can be missed.
+
+    pyramid = Pyramid(pygame.surfarray.array_red(surface), 'canny')
+    pyramid.compact = numpy.uint8
+    edges = pyramid.run()
+    maps = pyramid.maps()       # full resolution map, then 1/2, 1/4, 1/8
+"""
+
+import numpy
+
+import Engine
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+# Block side in pixels at full resolution
+BLOCK = 64
+
+
+def downsample(channel):
+    """
+    Half resolution (W // 2, H // 2) channel, mean of each 2x2 block. uint8 stays
+    uint8 (rounded) so the coarse levels use the integer accumulators.
+    """
+    width, height = channel.shape[0] // 2 * 2, channel.shape[1] // 2 * 2
+    block = channel[:width, :height]
+    if numpy.issubdtype(channel.dtype, numpy.integer) and channel.dtype.itemsize == 1:
+        total = block[0::2, 0::2].astype(numpy.uint16)
+        total += block[1::2, 0::2]
+        total += block[0::2, 1::2]
+        total += block[1::2, 1::2]
+        total += 2
+        total >>= 2
+        return total.astype(channel.dtype)
+    block = block.astype(numpy.float64, copy=False)
+    return (block[0::2, 0::2] + block[1::2, 0::2] + block[0::2, 1::2] + block[1::2, 1::2]) * 0.25
+
+
+def build(channel, levels):
+    """
+    The channel and its levels successive halvings.
+    """
+    pyramid = [channel]
+    for _ in range(levels):
+        if min(pyramid[-1].shape[:2]) < 2:
+            break
+        pyramid.append(downsample(pyramid[-1]))
+    return pyramid
+
+
+def _block_reduce(values, block, function):
+    """
+    function (numpy.maximum or numpy.minimum) of each block x block tile, the
+    partial tiles of the right and bottom edges included.
+    """
+    width, height = values.shape
+    columns, rows = -(-width // block), -(-height // block)
+    padded = numpy.pad(values, ((0, columns * block - width), (0, rows * block - height)), mode='edge')
+    return function.reduce(function.reduce(padded.reshape(columns, block, rows, block), axis=3), axis=1)
+
+
+def _dilate(values, function):
+    """
+    function of each block and its 8 neighbours.
+    """
+    padded = numpy.pad(values, 1, mode='edge')
+    result = values.copy()
+    width, height = values.shape
+    for dx in range(3):
+        for dy in range(3):
+            function(result, padded[dx:dx + width, dy:dy + height], out=result)
+    return result
+
+
+def _combine(bx, by, norm):
+    if norm == 'l1':
+        return bx + by
+    if norm == 'max':
+        return numpy.maximum(bx, by)
+    return numpy.sqrt(bx * bx + by * by)
+
+
+def magnitude_bound(channel, operator, block, norm='exact'):
+    """
+    Upper bound of the gradient magnitude of each block x block tile of channel,
+    from the minimum and the maximum of the tile and of its neighbours (the kernel
+    halo must not exceed block).
+    """
+    spec = Engine.OPERATORS[operator]
+    low = _dilate(_block_reduce(channel, block, numpy.minimum), numpy.minimum).astype(numpy.float64)
+    high = _dilate(_block_reduce(channel, block, numpy.maximum), numpy.maximum).astype(numpy.float64)
+    largest = numpy.maximum(numpy.abs(low), numpy.abs(high))
+    bounds = []
+    for kernel in (spec.gx, spec.gy):
+        # Any linear combination of the pixels: sum |weights| * max |pixel|
+        bound = numpy.abs(kernel).sum() * largest
+        if spec.passes is None and kernel.sum() == 0:
+            # Zero sum: sum(w * (p - min)) lies in [-negative, positive] * range
+            weight = max(kernel[kernel > 0].sum(), -kernel[kernel < 0].sum())
+            numpy.minimum(bound, weight * (high - low), out=bound)
+        bounds.append(bound)
+    return _combine(bounds[0], bounds[1], norm)
+
+
+class Pyramid:
+    """
+    Edge map of a (W, H) channel for an operator of Engine.OPERATORS, computed at
+    full resolution in the blocks selected at a coarse scale only. run() returns
+    what Engine.run(channel, operator, threshold, compact=compact,
+    low_threshold=low_threshold, norm=norm) returns, exactly when exact is True.
+    """
+
+    def __init__(self, channel, operator='sobel', threshold=None):
+        if operator not in Engine.OPERATORS:
+            raise ValueError('Unknown operator %r' % operator)
+        self.channel = channel
+        self.operator = operator
+        self.threshold = Engine.OPERATORS[operator].threshold if threshold is None else threshold
+        # Number of halvings of the pyramid
+        self.levels = 3
+        # Block side at full resolution, rounded up to a multiple of 2 ** levels
+        self.block = BLOCK
+        # False selects the blocks from the coarsest level (approximate map)
+        self.exact = True
+        # Approximate mode: coarse magnitude above which a block is refined,
+        # None for half the threshold
+        self.bound = None
+        # numpy.uint8 or numpy.float32 for a single channel output, None for (W, H, 3) float64
+        self.compact = None
+        # Double threshold with hysteresis, threshold becomes the high one
+        self.low_threshold = None
+        # Magnitude of the gradient, one of Engine.NORMS
+        self.norm = 'exact'
+        # (columns, rows) boolean map of the blocks computed by the last run()
+        self.active = None
+        self._pyramid = None
+        self._levels = None
+
+    def pyramid(self):
+        """
+        The channel and its downsampled levels, built once.
+        """
+        if self._levels != self.levels:
+            self._pyramid = build(self.channel, self.levels)
+            self._levels = self.levels
+        return self._pyramid
+
+    def _block(self):
+        factor = 1 << self.levels
+        return max(-(-self.block // factor) * factor, Engine.halo(self.operator))
+
+    def active_blocks(self, threshold):
+        """
+        (columns, rows) boolean map of the blocks of side _block() that may hold a
+        pixel above threshold.
+        """
+        block = self._block()
+        if self.exact:
+            bound = magnitude_bound(self.channel, self.operator, block, self.norm)
+            # Keep a margin for the float32 rounding of the compact magnitude
+            return bound > threshold - abs(threshold) * 1e-6
+        coarse = self.pyramid()[-1]
+        factor = self.channel.shape[0] // coarse.shape[0]
+        gx, gy = Engine.gradient(coarse, self.operator)
+        values = Engine.raw_magnitude(gx, gy, numpy.float64, self.norm)
+        width, height = self.channel.shape[:2]
+        columns, rows = -(-width // block), -(-height // block)
+        # Coarse pixels per block, the blocks past the coarse level border stay active
+        side = block // factor
+        strongest = numpy.full((columns, rows), numpy.inf)
+        reduced = _block_reduce(values, side, numpy.maximum)
+        cw, ch = min(columns, reduced.shape[0]), min(rows, reduced.shape[1])
+        strongest[:cw, :ch] = reduced[:cw, :ch]
+        # The coarse border pixels are zero, their blocks (first and last ones) are
+        # decided at full resolution
+        border = -(-Engine.BORDER // side)
+        strongest[:border, :] = numpy.inf
+        strongest[:, :border] = numpy.inf
+        strongest[max(coarse.shape[0] - Engine.BORDER, 0) // side:, :] = numpy.inf
+        strongest[:, max(coarse.shape[1] - Engine.BORDER, 0) // side:] = numpy.inf
+        bound = threshold * 0.5 if self.bound is None else self.bound
+        return _dilate(strongest, numpy.maximum) > bound
+
+    def _regions(self, threshold):
+        """
+        Regions (x0, x1, y0, y1) of the active blocks, one per run of consecutive
+        active blocks of a column.
+        """
+        width, height = self.channel.shape[:2]
+        block = self._block()
+        self.active = self.active_blocks(threshold)
+        for column in range(self.active.shape[0]):
+            x0, x1 = column * block, min((column + 1) * block, width)
+            row = 0
+            rows = self.active[column]
+            while row < len(rows):
+                if not rows[row]:
+                    row += 1
+                    continue
+                # One region for consecutive active blocks
+                end = row
+                while end < len(rows) and rows[end]:
+                    end += 1
+                yield x0, x1, row * block, min(end * block, height)
+                row = end
+
+    def _compute(self, threshold, compact):
+        width, height = self.channel.shape[:2]
+        if compact is None:
+            target = numpy.zeros((width, height, 3))
+        else:
+            target = numpy.zeros((width, height), dtype=compact)
+        for region in self._regions(threshold):
+            Engine.compute_region(self.channel, target, self.operator, threshold, region, self.norm)
+        return target
+
+    def _magnitude(self, threshold, dtype):
+        """
+        Raw magnitude (Engine.magnitude_region) of the blocks that may hold a pixel
+        above threshold, zero elsewhere.
+        """
+        values = numpy.zeros(self.channel.shape[:2], dtype=numpy.float64 if dtype == numpy.float64
+                             else numpy.float32)
+        for x0, x1, y0, y1 in self._regions(threshold):
+            values[x0:x1, y0:y1] = Engine.magnitude_region(self.channel, self.operator, (x0, x1, y0, y1),
+                                                           dtype, self.norm, threshold)
+        return values
+
+    def run(self):
+        """
+        Full resolution edge map.
+        """
+        if self.norm not in Engine.NORMS:
+            raise ValueError('norm must be one of %s, got %r' % (Engine.NORMS, self.norm))
+        if self.low_threshold is None:
+            return self._compute(self.threshold, self.compact)
+        dtype = numpy.float64 if self.compact is None else self.compact
+        map_ = Engine.double_threshold(self._magnitude(self.low_threshold, dtype), self.threshold,
+                                       self.low_threshold, dtype)
+        return Engine.expand(map_) if self.compact is None else map_
+
+    def maps(self):
+        """
+        Edge maps of every level, the full resolution one of run() first, then the
+        coarse levels (Engine.run of each downsampled level) for multi-scale uses.
+        """
+        return [self.run()] + [Engine.run(level, self.operator, self.threshold, compact=self.compact,
+                                          low_threshold=self.low_threshold, norm=self.norm)
+                               for level in self.pyramid()[1:]]
+
+    def refined(self):
+        """
+        Fraction of the blocks computed at full resolution by the last run().
+        """
+        return float(self.active.mean()) if self.active is not None and self.active.size else 0.0
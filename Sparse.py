@@ -0,0 +1,165 @@
+"""
+Sparse edge outputs.
+
+run() returns a dense (W, H, 3) float64 map, a consumer wanting the edge pixels
+then scans it again. coordinates() and runs() compute the operator band by band
+(BAND rows at a time) and keep the edge pixels of each band only: the dense map
+of the whole image is never built.
+
+    edges = coordinates(pygame.surfarray.array_red(surface), 'canny')
+    for x, y, value in zip(edges.x, edges.y, edges.values):
+        ...
+    segments = runs(pygame.surfarray.array_red(surface), 'sobel', 120)
+    mask = segments.mask()
+"""
+
+import numpy
+
+import Engine
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+# Image rows (y) computed at a time
+BAND = 64
+
+
+class Coordinates:
+    """
+    Edge pixels in scanline order (y, then x): int32 x and y and their values, the
+    values of Engine.run (float64, or the compact dtype).
+    """
+
+    def __init__(self, x, y, values, shape, compact=None):
+        self.x = x
+        self.y = y
+        self.values = values
+        # (W, H) of the image
+        self.shape = shape
+        self.compact = compact
+
+    def __len__(self):
+        return len(self.x)
+
+    def mask(self):
+        mask = numpy.zeros(self.shape, dtype=bool)
+        mask[self.x, self.y] = True
+        return mask
+
+    def dense(self):
+        """
+        The map Engine.run returns, (W, H, 3) float64 or (W, H) compact.
+        """
+        map_ = numpy.zeros(self.shape, dtype=self.values.dtype)
+        map_[self.x, self.y] = self.values
+        return Engine.expand(map_) if self.compact is None else map_
+
+
+class Runs:
+    """
+    Run-length encoding of the edge pixels of each image row: int32 y, first x and
+    length of the runs of consecutive edge pixels, in scanline order.
+    """
+
+    def __init__(self, y, start, length, shape):
+        self.y = y
+        self.start = start
+        self.length = length
+        # (W, H) of the image
+        self.shape = shape
+
+    def __len__(self):
+        return len(self.y)
+
+    def pixels(self):
+        return int(self.length.sum())
+
+    def coordinates(self):
+        """
+        x and y of every edge pixel, in scanline order.
+        """
+        first = numpy.cumsum(self.length) - self.length
+        x = numpy.repeat(self.start - first, self.length) + numpy.arange(self.pixels(), dtype=numpy.int32)
+        return x.astype(numpy.int32, copy=False), numpy.repeat(self.y, self.length)
+
+    def mask(self):
+        mask = numpy.zeros(self.shape, dtype=bool)
+        x, y = self.coordinates()
+        mask[x, y] = True
+        return mask
+
+
+def bands(source, operator='sobel', threshold=None, compact=None, norm='exact', band=BAND):
+    """
+    (y0, single channel edge map of the rows y0 .. y0 + band) for the whole image,
+    each band reads its rows plus the kernel halo.
+    """
+    if operator not in Engine.OPERATORS:
+        raise ValueError('Unknown operator %r' % operator)
+    if source.ndim == 3:
+        source = source[..., 0]
+    width, height = source.shape
+    dtype = numpy.float64 if compact is None else compact
+    for y0 in range(0, height, band):
+        y1 = min(y0 + band, height)
+        yield y0, Engine.operator_map(source, operator, threshold, (0, width, y0, y1), dtype, norm)
+
+
+def coordinates(source, operator='sobel', threshold=None, compact=None, norm='exact', band=BAND):
+    """
+    Edge pixels (non zero values of Engine.run) of a (W, H) channel, or of the
+    channel 0 of a (W, H, 3) array, as Coordinates.
+    """
+    xs, ys, values = [], [], []
+    for y0, map_ in bands(source, operator, threshold, compact, norm, band):
+        y, x = numpy.nonzero(map_.T)
+        xs.append(x.astype(numpy.int32))
+        ys.append((y + y0).astype(numpy.int32))
+        values.append(map_[x, y])
+    dtype = numpy.float64 if compact is None else compact
+    return Coordinates(numpy.concatenate(xs) if xs else numpy.zeros(0, numpy.int32),
+                       numpy.concatenate(ys) if ys else numpy.zeros(0, numpy.int32),
+                       numpy.concatenate(values) if values else numpy.zeros(0, dtype),
+                       source.shape[:2], compact)
+
+
+def runs(source, operator='sobel', threshold=None, compact=None, norm='exact', band=BAND):
+    """
+    Run-length encoding (Runs) of the edge pixels of each row of a (W, H) channel,
+    or of the channel 0 of a (W, H, 3) array. compact selects the dtype the values
+    are computed in, a uint8 value rounded to 0 is not an edge pixel.
+    """
+    ys, starts, lengths = [], [], []
+    for y0, map_ in bands(source, operator, threshold, compact, norm, band):
+        rows = map_.T != 0
+        padded = numpy.zeros((rows.shape[0], rows.shape[1] + 2), dtype=numpy.int8)
+        padded[:, 1:-1] = rows
+        # +1 where a run starts, -1 after its last pixel
+        change = numpy.diff(padded, axis=1)
+        y, start = numpy.nonzero(change == 1)
+        end = numpy.nonzero(change == -1)[1]
+        ys.append((y + y0).astype(numpy.int32))
+        starts.append(start.astype(numpy.int32))
+        lengths.append((end - start).astype(numpy.int32))
+    empty = numpy.zeros(0, numpy.int32)
+    return Runs(numpy.concatenate(ys) if ys else empty, numpy.concatenate(starts) if starts else empty,
+                numpy.concatenate(lengths) if lengths else empty, source.shape[:2])
+
+
+# Encodings of edges()
+ENCODINGS = ('coordinates', 'runs')
+
+
+def edges(source, encoding='coordinates', operator='sobel', threshold=None, compact=None, norm='exact'):
+    """
+    coordinates() or runs() by name, see ENCODINGS.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError('encoding must be one of %s, got %r' % (ENCODINGS, encoding))
+    return (coordinates if encoding == 'coordinates' else runs)(source, operator, threshold, compact, norm)
@@ -0,0 +1,138 @@
+"""
+Per-tile edge statistics fused with the gradient pass.
+
+tile_statistics() computes Gx and Gy one row of tiles at a time and reduces each
+band into per-tile figures before moving on: the edge density, the mean edge
+value and a histogram of the gradient orientations of the edge pixels (HOG
+style, weighted by the edge value). No full resolution map is kept unless it is
+asked for.
+
+    stats = tile_statistics(pygame.surfarray.array_red(surface), 'sobel', tile=16, bins=9)
+    stats.density          # (columns, rows) fraction of edge pixels
+    stats.histogram        # (columns, rows, bins)
+"""
+
+import numpy
+
+import Engine
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+# Tile side in pixels and orientation bins, the HOG defaults
+TILE = 16
+BINS = 9
+
+
+class TileStatistics:
+    """
+    Statistics of the tiles of an image, tile (column, row) covers the pixels
+    x in [column * tile, (column + 1) * tile), y in [row * tile, (row + 1) * tile),
+    the last column and row may be partial. An edge pixel is a non zero pixel of
+    Engine.run.
+    """
+
+    def __init__(self, tile, bins, signed, pixels, edges, total, histogram, map_=None):
+        self.tile = tile
+        self.bins = bins
+        # Orientation over 360 degrees (signed) or 180 degrees
+        self.signed = signed
+        # (columns, rows) pixels of each tile, edge pixels and sum of their values
+        self.pixels = pixels
+        self.edges = edges
+        self.total = total
+        # (columns, rows, bins) sum of the edge values per orientation bin
+        self.histogram = histogram
+        # Edge map of run(), when it was asked for
+        self.map = map_
+
+    @property
+    def density(self):
+        return self.edges / self.pixels
+
+    @property
+    def mean(self):
+        """
+        Mean edge value of each tile, over all its pixels.
+        """
+        return self.total / self.pixels
+
+    def normalized(self, epsilon=1e-6):
+        """
+        Histograms scaled to a unit L2 norm (HOG cell normalisation).
+        """
+        norm = numpy.sqrt((self.histogram ** 2).sum(axis=-1, keepdims=True) + epsilon ** 2)
+        return self.histogram / norm
+
+
+def _band(channel, operator, threshold, dtype, norm, y0, y1):
+    """
+    Edge map, Gx and Gy of the rows y0 .. y1, the suppression reads one more row of
+    gradient on each side (as Engine.suppressed_edge_map).
+    """
+    spec = Engine.OPERATORS[operator]
+    width, height = channel.shape
+    extra = 1 if spec.suppression else 0
+    ey0, ey1 = max(y0 - extra, 0), min(y1 + extra, height)
+    gx, gy = Engine.gradient(channel, operator, (0, width, ey0, ey1))
+    values = Engine.edge_map(gx, gy, threshold, dtype, spec.suppression, norm)
+    rows = slice(y0 - ey0, y1 - ey0)
+    return values[:, rows], gx[:, rows], gy[:, rows]
+
+
+def tile_statistics(source, operator='sobel', threshold=None, tile=TILE, bins=BINS, signed=False,
+                    norm='exact', compact=None, keep_map=False):
+    """
+    TileStatistics of a (W, H) channel, or of the channel 0 of a (W, H, 3) array.
+    The orientation bins are centred on +x, counter-clockwise: bins sectors of
+    360 / bins degrees when signed, else of 180 / bins degrees (opposite gradients
+    in the same bin). compact is the dtype the edge values are computed in (as
+    Engine.run), keep_map also returns the edge map of Engine.run.
+    """
+    if operator not in Engine.OPERATORS:
+        raise ValueError('Unknown operator %r' % operator)
+    if norm not in Engine.NORMS:
+        raise ValueError('norm must be one of %s, got %r' % (Engine.NORMS, norm))
+    if source.ndim == 3:
+        source = source[..., 0]
+    if threshold is None:
+        threshold = Engine.OPERATORS[operator].threshold
+    width, height = source.shape
+    dtype = numpy.float64 if compact is None else compact
+    columns, rows = -(-width // tile), -(-height // tile)
+    sides = numpy.minimum(tile, width - numpy.arange(columns) * tile)
+    pixels = numpy.outer(sides, numpy.minimum(tile, height - numpy.arange(rows) * tile)).astype(numpy.float64)
+    edges = numpy.zeros((columns, rows), dtype=numpy.int64)
+    total = numpy.zeros((columns, rows))
+    histogram = numpy.zeros((columns, rows, bins))
+    map_ = None
+    if keep_map:
+        map_ = numpy.zeros((width, height, 3)) if compact is None else numpy.zeros((width, height), dtype=compact)
+    column_of = numpy.arange(width) // tile
+
+    for row in range(rows):
+        y0, y1 = row * tile, min((row + 1) * tile, height)
+        values, gx, gy = _band(source, operator, threshold, dtype, norm, y0, y1)
+        if map_ is not None:
+            map_[:, y0:y1] = values[..., numpy.newaxis] if compact is None else values
+        x, y = numpy.nonzero(values)
+        if not len(x):
+            continue
+        column = column_of[x]
+        weights = values[x, y].astype(numpy.float64)
+        edges[:, row] = numpy.bincount(column, minlength=columns)
+        total[:, row] = numpy.bincount(column, weights, minlength=columns)
+        if signed:
+            sector = Engine.direction(gx[x, y], gy[x, y], bins)
+        else:
+            # 2 * bins sectors over 360 degrees, the opposite ones are merged
+            sector = Engine.direction(gx[x, y], gy[x, y], 2 * bins) % bins
+        histogram[:, row, :] = numpy.bincount(column * bins + sector, weights,
+                                              minlength=columns * bins).reshape(columns, bins)
+    return TileStatistics(tile, bins, signed, pixels, edges, total, histogram, map_)
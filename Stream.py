@@ -0,0 +1,172 @@
+"""
+Row streaming of the operators.
+
+Decoders and sensors deliver an image one row (scanline, y fixed) at a time. The
+generators below take an iterator of rows and yield the output rows as soon as
+the kernel window is filled, holding a ring of a few rows only: 3 rows for Sobel
+and Prewitt, 5 for the blur, the windows of blur + Canny are chained. The rows
+are array[:, y] of the pygame layout, (W,) channels or (W, 3) RGB rows, and the
+output rows are the rows of Engine.run (same values, same borders).
+
+Without the image height the bottom border is only known when the stream ends,
+the output then lags 2 rows behind the input instead of the kernel half size.
+
+    edges = numpy.stack(list(stream(decoder_rows, 'blur+canny', compact=numpy.uint8)), axis=1)
+"""
+
+from collections import deque
+
+import numpy
+
+import Engine
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+
+def rows_of(array_):
+    """
+    The rows array_[:, y] of a (W, H) or (W, H, 3) array, top to bottom.
+    """
+    for y in range(array_.shape[1]):
+        yield array_[:, y]
+
+
+def _window(rows, before, after, border, height, compute, zero):
+    """
+    Ring buffer driver: yields compute(window) for the row y once the rows
+    y - before .. y + after are known, zero(row) for the rows of the top and bottom
+    borders (border rows each). window is the list of those rows.
+    """
+    lookahead = after if height is not None else max(after, border)
+    ring = deque(maxlen=before + lookahead + 1)
+    received = 0
+    y = 0
+
+    def output(y, total):
+        if y < border or y >= total - border:
+            return zero(ring[-1])
+        start = y - before - (received - len(ring))
+        return compute([ring[index] for index in range(start, start + before + after + 1)])
+
+    for row in rows:
+        ring.append(row)
+        received += 1
+        if height is not None and received > height:
+            raise ValueError('More than %d rows' % height)
+        while y + lookahead < received:
+            # Without the height the row y + border is known, y is not in the bottom border
+            yield output(y, height if height is not None else received + border + 1)
+            y += 1
+    if height is not None and received != height:
+        raise ValueError('Expecting %d rows, got %d' % (height, received))
+    while y < received:
+        yield output(y, received)
+        y += 1
+
+
+def blur_rows(rows, height=None):
+    """
+    GaussianBlur5x5 rows, float64, of (W,) or (W, 3) rows (the 3 channels blurred).
+    """
+    def compute(window):
+        block = numpy.stack(window, axis=1)
+        if block.ndim == 3:
+            return Engine.gaussian_blur(block, (0, block.shape[0], 2, 3))[:, 0]
+        return Engine.gaussian_blur_channel(block, (0, block.shape[0], 2, 3))[:, 0]
+
+    def zero(row):
+        return numpy.zeros(numpy.shape(row))
+
+    return _window(rows, 2, 2, Engine.BORDER, height, compute, zero)
+
+
+def gradient_rows(rows, operator='sobel', height=None):
+    """
+    (Gx, Gy) rows of (W,) channel rows, what Engine.gradient gives for each row.
+    """
+    spec = Engine.OPERATORS[operator]
+    if spec.passes is not None:
+        raise ValueError('%r depends on the image height, it cannot be streamed' % operator)
+    half = spec.half
+    border = max(Engine.BORDER, half)
+
+    def compute(window):
+        row = window[half]
+        width = len(row)
+        dtype = Engine.accumulator(row.dtype, spec.gain)
+        gx, gy = numpy.zeros(width, dtype=dtype), numpy.zeros(width, dtype=dtype)
+        if width > 2 * border:
+            block = numpy.stack(window, axis=1)[border - half:width - border + half]
+            bgx, bgy = spec.kernel(Engine.working_array(block, spec.gain), 0, 0)
+            gx[border:width - border] = bgx[:, 0]
+            gy[border:width - border] = bgy[:, 0]
+        return gx, gy
+
+    def zero(row):
+        dtype = Engine.accumulator(row.dtype, spec.gain)
+        return numpy.zeros(len(row), dtype=dtype), numpy.zeros(len(row), dtype=dtype)
+
+    return _window(rows, half, half, border, height, compute, zero)
+
+
+def edge_rows(rows, operator='sobel', threshold=None, compact=None, norm='exact', height=None):
+    """
+    Single channel edge map rows (float64, or the compact dtype) of (W,) channel rows.
+    """
+    if norm not in Engine.NORMS:
+        raise ValueError('norm must be one of %s, got %r' % (Engine.NORMS, norm))
+    if threshold is None:
+        threshold = Engine.OPERATORS[operator].threshold
+    dtype = numpy.float64 if compact is None else compact
+    gradients = gradient_rows(rows, operator, height)
+    if not Engine.OPERATORS[operator].suppression:
+        for gx, gy in gradients:
+            yield Engine.edge_map(gx, gy, threshold, dtype, norm=norm)
+        return
+
+    def compute(window):
+        # The suppression compares each pixel with the rows above and below
+        gx = numpy.stack([pair[0] for pair in window], axis=1)
+        gy = numpy.stack([pair[1] for pair in window], axis=1)
+        return Engine.edge_map(gx, gy, threshold, dtype, True, norm)[:, 1]
+
+    def zero(pair):
+        return numpy.zeros(len(pair[0]), dtype=dtype)
+
+    for row in _window(gradients, 1, 1, 1, height, compute, zero):
+        yield row
+
+
+def stream(rows, operator='sobel', threshold=None, compact=None, norm='exact', height=None):
+    """
+    Rows of Engine.run(image, operator, threshold, compact=compact, norm=norm) for
+    the rows of the image. operator is a name of Engine.OPERATORS, 'blur' or
+    'blur+' an operator ('blur+canny': GaussianBlur5x5 then Canny, as OutOfCore.py).
+    The gradient operators read the channel 0 of (W, 3) rows, 'blur' the 3 channels
+    ((W,) rows in compact mode). The rows are (W, 3) float64, or (W,) compact ones.
+    The hysteresis follows the edges over the whole image, it cannot be streamed.
+    """
+    blur, _, operator = operator.rpartition('+') if '+' in operator else ('', '', operator)
+    if operator == 'blur':
+        blur, operator = operator, None
+    elif operator not in Engine.OPERATORS:
+        raise ValueError('Unknown operator %r' % operator)
+    if blur and blur != 'blur':
+        raise ValueError('Only the blur can be chained, got %r' % blur)
+    if operator is not None or compact is not None:
+        rows = (row[..., 0] if numpy.ndim(row) == 2 else row for row in rows)
+    if blur:
+        rows = blur_rows(rows, height)
+    if operator is None:
+        for row in rows:
+            yield row if compact is None else Engine.convert(row, compact)
+        return
+    for row in edge_rows(rows, operator, threshold, compact, norm, height):
+        yield Engine.expand(row) if compact is None else row
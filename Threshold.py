@@ -0,0 +1,143 @@
+"""
+Threshold selection from a single gradient pass.
+
+The run() methods fuse the threshold into the computation, trying another
+threshold means computing the gradient again. Magnitude keeps the raw magnitude
+of an image, any number of thresholds are then applied without touching the
+gradient, and a histogram of the integer levels computed once gives automatic thresholds
+(Otsu or a percentile) and the number of edge pixels of a threshold sweep.
+
+    magnitude = Magnitude(pygame.surfarray.array_red(surface), 'canny')
+    edges = magnitude.apply(magnitude.otsu())
+    counts = magnitude.counts(range(0, 256, 5))
+"""
+
+import numpy
+
+import Engine
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+# Minimum number of bins of histogram(), the raw magnitudes go above 255 (up to
+# 1442 for Sobel)
+BINS = 256
+
+
+def histogram(magnitude_):
+    """
+    Histogram of a raw magnitude, bin k counts the values in (k - 1, k] and bin 0
+    the zeros, one bin per integer up to the largest value (at least BINS bins).
+    The pixels above an integer threshold t are the bins t + 1 and above.
+    """
+    index = numpy.ceil(magnitude_).astype(numpy.intp).ravel()
+    return numpy.bincount(index, minlength=BINS)
+
+
+def above(histogram_):
+    """
+    Number of pixels above each integer threshold 0 .. len(histogram_) - 1.
+    """
+    return histogram_.sum() - numpy.cumsum(histogram_)
+
+
+def otsu(histogram_):
+    """
+    Otsu threshold of a histogram, the integer threshold that maximises the variance
+    between the 2 classes (pixels below or at the threshold, pixels above).
+    """
+    counts = numpy.asarray(histogram_, dtype=numpy.float64)
+    levels = numpy.arange(len(counts), dtype=numpy.float64)
+    weight = numpy.cumsum(counts)
+    total = weight[-1]
+    moment = numpy.cumsum(counts * levels)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        below_mean = moment / weight
+        above_mean = (moment[-1] - moment) / (total - weight)
+        variance = weight * (total - weight) * (below_mean - above_mean) ** 2
+    variance[~numpy.isfinite(variance)] = -1
+    return int(numpy.argmax(variance))
+
+
+def percentile(histogram_, percentile_):
+    """
+    Smallest integer threshold leaving at most (100 - percentile_) % of the pixels
+    above it, percentile_=90 keeps the 10 % strongest pixels.
+    """
+    limit = histogram_.sum() * (100.0 - percentile_) / 100.0
+    return int(numpy.argmax(above(histogram_) <= limit))
+
+
+class Magnitude:
+    """
+    Raw gradient magnitude of a (W, H) channel for an operator of Engine.OPERATORS,
+    computed once and thresholded on demand. apply(threshold) returns what
+    Engine.run(channel, operator, threshold, compact=compact, norm=norm) returns.
+    """
+
+    def __init__(self, channel, operator='sobel', norm='exact', compact=None):
+        if norm not in Engine.NORMS:
+            raise ValueError('norm must be one of %s, got %r' % (Engine.NORMS, norm))
+        self.operator = operator
+        self.compact = compact
+        self.dtype = numpy.float64 if compact is None else compact
+        gx, gy = Engine.gradient(channel, operator)
+        # The non-maximum suppression keeps the same pixels whatever the threshold
+        self.values = Engine.raw_magnitude(gx, gy, self.dtype, norm, Engine.OPERATORS[operator].suppression)
+        self._histogram = None
+
+    @property
+    def histogram(self):
+        if self._histogram is None:
+            self._histogram = histogram(self.values)
+        return self._histogram
+
+    def apply(self, threshold=None, low_threshold=None):
+        """
+        Edge map for a threshold (the default one of the operator), with the double
+        threshold and the hysteresis when low_threshold is given.
+        """
+        if threshold is None:
+            threshold = Engine.OPERATORS[self.operator].threshold
+        if low_threshold is not None:
+            map_ = Engine.double_threshold(self.values.copy(), threshold, low_threshold, self.dtype)
+        else:
+            map_ = Engine.threshold_map(self.values, threshold, self.dtype)
+        return Engine.expand(map_) if self.compact is None else map_
+
+    def sweep(self, thresholds):
+        """
+        Edge maps of a sequence of thresholds, one at a time.
+        """
+        for threshold in thresholds:
+            yield threshold, self.apply(threshold)
+
+    def counts(self, thresholds):
+        """
+        Number of edge pixels for each integer threshold, read from the histogram.
+        Raises ValueError for a threshold that is not an integer, apply() counts them.
+        """
+        table = above(self.histogram)
+        total = self.histogram.sum()
+        counts = []
+        for threshold in thresholds:
+            if threshold != int(threshold):
+                raise ValueError('counts() reads integer thresholds, got %r' % (threshold,))
+            threshold = int(threshold)
+            if threshold < 0:
+                counts.append(int(total))
+            else:
+                counts.append(int(table[threshold]) if threshold < len(table) else 0)
+        return counts
+
+    def otsu(self):
+        return otsu(self.histogram)
+
+    def percentile(self, percentile_):
+        return percentile(self.histogram, percentile_)
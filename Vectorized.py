@@ -0,0 +1,141 @@
+"""
+Engine paths shared by the operator classes.
+
+Sobel, Sobel2, Sobel3, Sobel4, Prewitt, Canny and GaussianBlur5x5 keep their
+per-pixel loops in run() and inherit the rest from Vectorized: the settings,
+the choice between the loops and the engine (Engine.py) and the engine methods.
+A class names its operator (a name of Engine.OPERATORS or 'blur') in operator.
+
+    class Roberts(Vectorized):
+        operator = 'roberts'
+"""
+
+import Engine
+import Sparse
+import Statistics
+
+__author__ = "Yoann Berenguer"
+__copyright__ = "Copyright 2007."
+__credits__ = ["Yoann Berenguer"]
+__license__ = "MIT License"
+__version__ = "1.0.0"
+__maintainer__ = "Yoann Berenguer"
+__email__ = "yoyoberenguer@hotmail.com"
+__status__ = "Demo"
+
+
+class Vectorized:
+    """
+    Base of the operator classes, run() starts with:
+
+        if self.engine():
+            return self.run_engine()
+    """
+
+    # Name of the operator in Engine.OPERATORS, or 'blur'
+    operator = None
+    # The loops read the array instead of the Surface
+    reads_array = False
+    # Defaults of the settings a class does not have: the threshold of the operator,
+    # no hysteresis, no non-maximum suppression, no direction, the exact magnitude
+    threshold = None
+    low_threshold = None
+    suppression = False
+    direction = None
+    norm = 'exact'
+
+    def __init__(self, surface_, array_, vectorized=False):
+        self._settings(surface_, array_, vectorized)
+
+    def _settings(self, surface_, array_, vectorized, gradient=True, direction=True):
+        """
+        Inputs and settings of the classes, gradient adds the magnitude norm and
+        direction the gradient direction.
+        """
+        self.surface = surface_
+        self.shape = array_.shape
+        self.array = array_
+        # Allocated by run(), the compact mode never needs the (W, H, 3) float64 array
+        self.source_array = None
+        # Use the whole-image engine (Engine.py) instead of the per-pixel loops
+        self.vectorized = vectorized
+        # Number of worker processes, None for a single core
+        self.workers = None
+        # numpy.uint8 or numpy.float32 for a single channel output, None for (W, H, 3) float64
+        self.compact = None
+        if gradient:
+            # Magnitude of the gradient, 'exact', 'l1', 'max' or 'lut' (see Engine.NORMS)
+            self.norm = 'exact'
+        if direction:
+            # 'radians' or a number of bins (uint8) to get the gradient direction in
+            # direction_array, computed from the same Gx and Gy
+            self.direction = None
+            self.direction_array = None
+
+    def source(self):
+        """
+        Pixels the engine reads, the ones of the loops: the red channel of the
+        Surface, or the channel 0 of the array for the loops reading the array or
+        without Surface.
+        """
+        # Same pixels as surface.get_at()[0]
+        return Engine.read_channel(None if self.reads_array else self.surface, self.array)
+
+    def engine(self):
+        """
+        True when run() goes through the engine: vectorized, workers, compact output,
+        a setting the loops do not have, or no input the loops can read.
+        """
+        return bool(self.vectorized or self.workers or self.compact or self.suppression
+                    or self.low_threshold is not None or self.direction is not None
+                    or self.norm != 'exact' or self.array.ndim == 2
+                    or (self.surface is None and not self.reads_array))
+
+    def run(self):
+        """
+        Engine output, the classes with per-pixel loops override run().
+        """
+        return self.run_engine()
+
+    def run_engine(self):
+        """
+        run() through the engine, the direction goes into direction_array.
+        """
+        if self.direction is not None:
+            self.source_array, self.direction_array = Engine.run_direction(
+                self.source(), self.operator, self.threshold, self.direction, self.compact, self.norm)
+            return self.source_array
+        self.source_array = Engine.run(self.source(), self.operator, self.threshold, self.workers,
+                                       self.compact, self.low_threshold, self.norm)
+        return self.source_array
+
+    def run_region(self, rect):
+        """
+        run() for the rectangle rect (x, y, width, height or a pygame.Rect) only, the
+        rectangle plus the kernel halo is read. Returns an array of the rectangle size.
+        The hysteresis follows the edges over the whole image, it is not available here.
+        """
+        if self.low_threshold is not None:
+            raise ValueError('The hysteresis (low_threshold) needs the whole image, use run()')
+        return Engine.run_region(self.source(), Engine.rect_region(rect), self.operator, self.threshold,
+                                 self.compact, self.norm)
+
+    def run_sparse(self, encoding='coordinates'):
+        """
+        Edge pixels of run() as Sparse.Coordinates, or Sparse.Runs for encoding='runs',
+        computed band by band without the dense map. No hysteresis, as run_region().
+        """
+        if self.low_threshold is not None:
+            raise ValueError('The hysteresis (low_threshold) needs the whole image, use run()')
+        return Sparse.edges(self.source(), encoding, self.operator, self.threshold, self.compact, self.norm)
+
+    def run_statistics(self, tile=Statistics.TILE, bins=Statistics.BINS, signed=False):
+        """
+        Statistics.TileStatistics (edge density and orientation histograms per tile)
+        of the edges of run(), computed in the gradient pass without the dense map.
+        No hysteresis, as run_region().
+        """
+        if self.low_threshold is not None:
+            raise ValueError('The hysteresis (low_threshold) needs the whole image, use run()')
+        return Statistics.tile_statistics(self.source(), self.operator, self.threshold, tile, bins, signed,
+                                          self.norm, self.compact)
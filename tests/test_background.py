@@ -0,0 +1,16 @@
+import numpy
+
+from Background import Background
+from Canny import CannyPipeline
+
+
+def test_background_runs_canny_pipeline():
+    array_ = numpy.random.RandomState(0).randint(0, 256, (40, 30, 3)).astype(numpy.uint8)
+    pipeline = CannyPipeline(array_)
+    expected = CannyPipeline(array_).run()
+    with Background(pipeline) as driver:
+        assert numpy.array_equal(driver.submit().result(timeout=60), expected)
+        other = array_[::-1].copy()
+        assert numpy.array_equal(driver.submit(None, other).result(timeout=60), CannyPipeline(other).run())
+        assert not driver.busy()
+    assert not hasattr(pipeline, 'surface')
@@ -0,0 +1,16 @@
+import numpy
+
+import Engine
+import Pyramid
+
+
+def test_approximate_keeps_edges_on_the_last_column_and_row():
+    for width, height in ((256, 256), (256, 200), (264, 256)):
+        channel = numpy.full((width, height), 50, numpy.uint8)
+        channel[-4:, :] = 250
+        channel[:, -4:] = 250
+        pyramid = Pyramid.Pyramid(channel, 'sobel', 100)
+        pyramid.exact = False
+        pyramid.block = 16
+        assert numpy.array_equal(pyramid.run(), Engine.run(channel, 'sobel', 100))
+        assert pyramid.active[-1, :].all() and pyramid.active[:, -1].all()